@@ -0,0 +1,83 @@
+from typing import List, Tuple
+import argparse
+import subprocess
+import tempfile
+import json
+import os
+import sys
+
+SCRAPER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper")
+
+# The modules a process imports to start: the main process, the pool workers and the distributed workers
+MODULES = ("main", "tasks", "engines", "worker")
+
+# Imported on first use only, a process that starts should not load them
+LAZY = ("pandas", "numpy", "bs4", "graphql", "requests", "urllib3", "httpx", "overrides")
+
+
+def import_time(module: str) -> Tuple[float, List[Tuple[float, str]], List[str]]:
+    """
+    Imports a module in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        Tuple[float, List[Tuple[float, str]], List[str]]: The import time of the module in milliseconds, the
+        cumulative milliseconds of each package it imported directly, and the lazy modules it loaded.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "URL_DB": "sqlite://", "LOG_PATH": tmp, "PYTHONPATH": SCRAPER}
+        code = f"import sys, json, {module}; print(json.dumps([name for name in {LAZY!r} if name in sys.modules]))"
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], env=env, cwd=SCRAPER, capture_output=True, text=True, check=True
+        )
+
+    total, children = 0.0, []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip() == "cumulative":
+            continue
+        # Children are listed before their parent, indented by two more spaces per level
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            children.append((int(cumulative) / 1000, name.strip()))
+        elif depth == 0 and name.strip() == module:
+            total = int(cumulative) / 1000
+            break
+        elif depth == 0:
+            children = []  # Imported by the interpreter's startup, e.g. site
+    return total, sorted(children, reverse=True), json.loads(process.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    """
+    Measures how long each entry point takes to import, the best of several runs, and fails if one takes
+    longer than the budget or loads a module that should be imported lazily.
+
+    Example:
+        python benchmark/imports.py --budget-ms 750
+    """
+    parser = argparse.ArgumentParser(description="Import time of the scraper's entry points.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", 750)), help="maximum import time of each module")
+    parser.add_argument("--runs", type=int, default=5, help="imports per module, the fastest counts")
+    parser.add_argument("--top", type=int, default=5, help="slowest direct imports listed per module")
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        runs = [import_time(module) for _ in range(args.runs)]
+        total, children, lazy = min(runs, key=lambda run: run[0])
+        over = total > args.budget_ms
+        failed = failed or over or bool(lazy)
+
+        print(f"{module:>8}: {total:7.1f} ms{'  over budget' if over else ''}")
+        for cumulative, name in children[:args.top]:
+            print(f"{'':>10}{cumulative:7.1f} ms  {name}")
+        if lazy:
+            print(f"{'':>10}loaded at import: {', '.join(lazy)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
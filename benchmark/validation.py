@@ -0,0 +1,95 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from datetime import datetime
+from timeit import timeit
+import os
+import sys
+
+# Append the scraper directory to the sys.path, an in-memory database is enough for benchmarking
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper"))
+os.environ.setdefault("URL_DB", "sqlite://")
+
+from database import Base, Company, Review, ReviewBase, validate_reviews, insert_reviews
+
+
+def make_reviews(n: int) -> list[dict]:
+    """
+    Build n parsed reviews shaped like the output of `parse_reviews()`.
+    """
+    text = "great people good benefits but long hours and slow promotions " * 4
+    return [
+        {
+            "review_id": i,
+            "date_time": datetime(2024, 1, 1, 12, 0, 0),
+            "rating_overall": 4,
+            "rating_ceo": "APPROVE",
+            "rating_business_outlook": "POSITIVE",
+            "rating_work_life_balance": 3.0,
+            "rating_culture_and_values": 4.0,
+            "rating_diversity_and_inclusion": 4.0,
+            "rating_senior_leadership": 3.0,
+            "rating_recommend_to_friend": "POSITIVE",
+            "rating_career_opportunities": 4.0,
+            "rating_compensation_and_benefits": 5.0,
+            "is_current_job": True,
+            "length_of_employment": 3,
+            "employment_status": "REGULAR",
+            "job_ending_year": None,
+            "job_title": "software engineer",
+            "location": "santa clara ca",
+            "pros": text,
+            "cons": text,
+            "summary": "good place to work",
+            "advice": text,
+            "count_helpful": 1,
+            "count_not_helpful": 0,
+            "is_covid19": False,
+        }
+        for i in range(n)
+    ]
+
+
+def per_record(session, reviews: list[dict], company: Company) -> None:
+    """
+    The previous path: ReviewBase, model_dump() and Review() for every review.
+    """
+    for review in reviews:
+        observation = Review(**ReviewBase(**review).model_dump())
+        observation.company = company
+        session.add(observation)
+    session.commit()
+
+
+def batched(session, reviews: list[dict], company: Company) -> None:
+    """
+    The batch path: one validation call per page and one executemany INSERT.
+    """
+    rows, _invalid = validate_reviews(reviews)
+    for row in rows:
+        row["employer_id"] = company.employer_id
+    insert_reviews(session, rows)
+    session.commit()
+
+
+def main(pages: int = 50, page_size: int = 10, repeat: int = 3) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    company = Company(employer_id=1, employer_name="Benchmark")
+    session.add(company)
+    session.commit()
+
+    page = make_reviews(page_size)
+
+    for name, path in [("per-record", per_record), ("batched", batched)]:
+        seconds = timeit(lambda: [path(session, page, company) for _ in range(pages)], number=repeat) / repeat
+        print(f"{name:>10}: {pages * page_size / seconds:,.0f} reviews/s ({seconds:.3f} s per {pages} pages)")
+
+    validate_only = timeit(lambda: validate_reviews(page), number=1000) / 1000
+    construct_only = timeit(lambda: [ReviewBase(**review).model_dump() for review in page], number=1000) / 1000
+    print(f"\nValidation only, per page of {page_size}: per-record {construct_only * 1e6:.0f} us, batched {validate_only * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-from .setup import setup_logging, logger, get_queue
+from .setup import setup_logging, logger, get_queue, attach_queue
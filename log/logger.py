@@ -1,7 +1,15 @@
+from logging.handlers import QueueHandler, RotatingFileHandler
+from time import monotonic
 import datetime as dt
-import json
 import logging
-from overrides import overrides
+import random
+import orjson
+import os
+
+try:
+    from typing import override
+except ImportError:  # Before Python 3.12, typing_extensions comes with pydantic and SQLAlchemy
+    from typing_extensions import override
 
 LOG_RECORD_BUILTIN_ATTRS = {
     "args",
@@ -30,6 +38,30 @@ LOG_RECORD_BUILTIN_ATTRS = {
 }
 
 
+# Fields of a log record larger than this many bytes of JSON are truncated
+MAX_FIELD_BYTES = int(os.getenv("LOG_MAX_FIELD_BYTES", 2048))
+
+# Share of log records whose large fields are kept whole, for debugging
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+
+
+def compact_payload(record: logging.LogRecord) -> None:
+    """
+    Truncates the `extra` fields of a record that serialize to more than MAX_FIELD_BYTES, e.g. whole reviews
+    or overviews, unless the record is sampled to keep them. Truncated fields become a string with the start
+    of their JSON and their size.
+    """
+    if random.random() < PAYLOAD_SAMPLE_RATE:
+        return
+
+    for key, val in list(record.__dict__.items()):
+        if key in LOG_RECORD_BUILTIN_ATTRS or isinstance(val, (bool, int, float, type(None))):
+            continue
+        data = val.encode() if isinstance(val, str) else orjson.dumps(val, default=str)
+        if len(data) > MAX_FIELD_BYTES:
+            setattr(record, key, f"{data[:MAX_FIELD_BYTES].decode(errors='ignore')}... [{len(data)} bytes]")
+
+
 class MyJSONFormatter(logging.Formatter):
     """
     Source code: https://github.com/mCodingLLC/VideosSampleCode/blob/master/videos/135_modern_logging/mylogger.py
@@ -44,10 +76,10 @@ class MyJSONFormatter(logging.Formatter):
         super().__init__()
         self.fmt_keys = fmt_keys if fmt_keys is not None else {}
 
-    @overrides
+    @override
     def format(self, record: logging.LogRecord) -> str:
         message = self._prepare_log_dict(record)
-        return json.dumps(message, default=str)
+        return orjson.dumps(message, default=str).decode()
 
     def _prepare_log_dict(self, record: logging.LogRecord):
         always_fields = {
@@ -80,6 +112,101 @@ class MyJSONFormatter(logging.Formatter):
 
 
 class NonErrorFilter(logging.Filter):
-    @overrides
+    @override
     def filter(self, record: logging.LogRecord) -> bool | logging.LogRecord:
         return record.levelno <= logging.INFO
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes at most `limit` records per URL, or per message for records without a URL, and level in every
+    window of `seconds`, so that an error storm on one employer does not flood the log. The first record
+    after a window with dropped records carries their number as `suppressed`.
+    """
+
+    def __init__(self, limit: int | None = None, seconds: float | None = None) -> None:
+        super().__init__()
+        self.limit = limit if limit is not None else int(os.getenv("LOG_RATE_LIMIT", 10))
+        self.seconds = seconds if seconds is not None else float(os.getenv("LOG_RATE_SECONDS", 60))
+        self._windows: dict[tuple, list] = {}
+
+    @override
+    def filter(self, record: logging.LogRecord) -> bool | logging.LogRecord:
+        now = monotonic()
+        # Call sites pass the URL as `url` or `URL`
+        url = getattr(record, "url", None) or getattr(record, "URL", None)
+        key = (record.levelno, url if url is not None else str(record.msg))
+
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.seconds:
+            if len(self._windows) > 10000:
+                self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.seconds}
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            window = self._windows[key] = [now, 0, 0]  # Start, records passed, records dropped
+
+        if window[1] >= self.limit:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class CompactQueueHandler(QueueHandler):
+    """
+    A QueueHandler that truncates large payloads before the record is pickled onto the queue.
+    """
+
+    @override
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        compact_payload(record)
+        return record
+
+
+class BatchingFileHandler(RotatingFileHandler):
+    """
+    A RotatingFileHandler that writes and flushes formatted records in batches, once `batch_size` records
+    are buffered or `flush_seconds` have passed, instead of once per record.
+    """
+
+    def __init__(self, *args, batch_size: int = 100, flush_seconds: float = 1.0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._buffer: list[str] = []
+        self._flushed_at = monotonic()
+
+    @override
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._buffer.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._buffer) >= self.batch_size or monotonic() - self._flushed_at >= self.flush_seconds:
+            self.flush()
+
+    @override
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            self._flushed_at = monotonic()
+            if not self._buffer:
+                return
+            data = "".join(self._buffer)
+            self._buffer.clear()
+
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() + len(data) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(data)
+            self.stream.flush()
+        finally:
+            self.release()
+
+    @override
+    def close(self) -> None:
+        self.flush()
+        super().close()
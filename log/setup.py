@@ -1,6 +1,5 @@
 from multiprocessing import Queue
-from typing import Tuple
-from threading import Thread
+from typing import Optional
 import json
 from logging.config import dictConfig
 from logging.handlers import QueueHandler, QueueListener
@@ -12,15 +11,9 @@ import os
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-logger = logging.getLogger(__name__)
+from logger import CompactQueueHandler, RateLimitFilter
 
-def logger_thread(q: queue.Queue) -> None:
-    while True:
-        record = q.get()
-        if record is None:
-            break
-        logger = logging.getLogger(record.name)
-        logger.handle(record)
+logger = logging.getLogger(__name__)
 
 m_queue = None
 
@@ -31,7 +24,69 @@ def get_queue() -> Queue:
     return m_queue
 
 
-def setup_logging() -> Tuple[QueueListener, Thread]: 
+def queue_handler() -> QueueHandler:
+    """
+    Returns a handler that sends records to the listener in the main process, rate limited per URL and
+    with large payloads truncated before they are pickled.
+    """
+    handler = CompactQueueHandler(get_queue())
+    handler.addFilter(RateLimitFilter())
+    return handler
+
+
+def attach_queue(log_queue: Optional[Queue] = None) -> None:
+    """
+    Sends the log records of this process to the listener in the main process, once per process. Forked
+    worker processes inherit the handler of the main process, others are given its queue.
+
+    Args:
+        log_queue (Optional[Queue]): The queue of the main process's listener, from `get_queue()`.
+    """
+    global m_queue
+    if log_queue is not None:
+        m_queue = log_queue
+    root_logger = logging.getLogger()
+    if not any(isinstance(handler, QueueHandler) for handler in root_logger.handlers):
+        root_logger.addHandler(queue_handler())
+
+
+class LogListener(QueueListener):
+    """
+    A QueueListener that flushes its handlers whenever the queue stays empty for `flush_seconds`, so that
+    batched records are written while the run is quiet.
+    """
+
+    def __init__(self, queue: Queue, *handlers: logging.Handler, flush_seconds: float = 1.0) -> None:
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self.flush_seconds = flush_seconds
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_seconds)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+    def stop(self) -> None:
+        """
+        Writes the records still queued, then flushes and closes the handlers.
+        """
+        super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+def setup_logging() -> LogListener:
+    """
+    Configures logging for the main process and starts the listener that writes the records of all processes.
+
+    Records of the main process and of the worker processes go through one multiprocessing queue to a single
+    listener thread, which writes them to stderr and to `log.jsonl` in `LOG_PATH`.
+
+    Returns:
+        LogListener: The started listener. Call `stop()` before exiting to write the records still queued.
+    """
     config_file = pathlib.Path(__file__).parent / "config.json"
     with open(config_file) as f_in:
         config = json.load(f_in)
@@ -41,31 +96,20 @@ def setup_logging() -> Tuple[QueueListener, Thread]:
         os.getenv("LOG_PATH"), "log.jsonl"
     )
 
-    log_queue = queue.Queue(-1)  # Create a Queue
-    config["handlers"]["queue_handler"]["queue"] = log_queue  # Add the Queue to the queue_handler configuration
-
     dictConfig(config)
 
-    # Create the QueueHandler directly
-    queue_handler = QueueHandler(log_queue)
-
-    # Get the root logger and set its handlers to the QueueHandler
+    # Hand the configured handlers to the listener, the root logger only enqueues records
     root_logger = logging.getLogger()
-    root_logger.handlers = [queue_handler]
+    handlers = root_logger.handlers
+    root_logger.handlers = [queue_handler()]
 
-    # Create a QueueListener with the new QueueHandler
-    listener = QueueListener(log_queue, queue_handler)
+    listener = LogListener(get_queue(), *handlers)
     listener.start()
-
-    # Start the logger thread
-    lt = Thread(target=logger_thread, args=(log_queue,))
-    lt.start()
-
-    return listener, lt
+    return listener
 
 
 def main():
-    setup_logging()
+    listener = setup_logging()
     logger.setLevel(logging.INFO)
     logger.debug("debug message", extra={"x": "hello"})
     logger.info("info message")
@@ -76,6 +120,7 @@ def main():
         1 / 0
     except ZeroDivisionError:
         logger.exception("exception message")
+    listener.stop()
 
 
 if __name__ == "__main__":
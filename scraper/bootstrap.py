@@ -0,0 +1,68 @@
+from multiprocessing import get_all_start_methods, set_forkserver_preload, set_start_method
+from typing import Any, Dict, Optional
+import sys
+import os
+
+from database.shared import apply_settings as apply_shared, settings as shared_settings
+from log import attach_queue, get_queue
+from metrics import apply_settings as apply_metrics, settings as metrics_settings
+from profiling import apply_settings as apply_profiling, settings as profiling_settings
+from tracing import apply_settings as apply_tracing, settings as tracing_settings
+
+# How worker processes are started: "forkserver" forks them from a server process that imported PRELOAD once,
+# "fork" from the main process, "spawn" starts fresh interpreters
+START_METHOD = os.getenv("WORKER_START_METHOD", "forkserver")
+
+# Imported by the forkserver, shared copy-on-write by every worker forked from it. The main process imports
+# the HTTP clients and parsers lazily, the workers find them imported.
+PRELOAD = ["tasks", "bs4", "graphql", "requests", "urllib3"]
+
+
+def configure_workers(method: Optional[str] = None) -> str:
+    """
+    Sets how this process starts its worker processes, before it creates any queue, event or pool, which
+    must belong to the same start method.
+
+    Args:
+        method (Optional[str]): "forkserver", "fork" or "spawn". Defaults to `WORKER_START_METHOD`, else
+            "forkserver", or "spawn" where there is no forkserver.
+
+    Returns:
+        str: The start method.
+    """
+    method = method or START_METHOD
+    if method not in get_all_start_methods():
+        method = "spawn"
+    if method == "forkserver":
+        # Before Python 3.12 the forkserver does not get this process's sys.path, it would not find the
+        # scraper's modules and skip preloading them
+        os.environ["PYTHONPATH"] = os.pathsep.join(path for path in sys.path if path)
+        set_forkserver_preload(PRELOAD)
+    set_start_method(method, force=True)
+    return method
+
+
+def worker_state() -> Dict[str, Any]:
+    """
+    Captures what a worker process needs from the main process, which a forkserver or spawned worker does
+    not inherit: the log and metrics queues, the trace of the run, the profiling options and the shared
+    memory of the known reviews.
+    """
+    return {
+        "log_queue": get_queue(),
+        "metrics": metrics_settings(),
+        "tracing": tracing_settings(),
+        "profiling": profiling_settings(),
+        "shared": shared_settings(),
+    }
+
+
+def apply_worker_state(state: Dict[str, Any]) -> None:
+    """
+    Applies the state of `worker_state()` in a worker process. Forked workers get what they inherited.
+    """
+    attach_queue(state["log_queue"])
+    apply_metrics(state["metrics"])
+    apply_tracing(state["tracing"])
+    apply_profiling(state["profiling"])
+    apply_shared(state["shared"])
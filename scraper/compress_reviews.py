@@ -0,0 +1,121 @@
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from datetime import datetime
+import argparse
+import os
+import sys
+
+# Append the path to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()  # Load .env file
+
+from database import Review, TextDictionary, codec, engine, get_db, train_dictionary
+from database.migrations import create_text_indexes, drop_text_indexes, reclaim_space
+
+TEXT_FIELDS = ("pros", "cons", "summary", "advice")
+
+
+def train(session: Session, sample_size: int, dict_size: int) -> int:
+    """
+    Train a dictionary on a random sample of reviews and store it in the database.
+
+    Args:
+        session (Session): The database session.
+        sample_size (int): The number of reviews to sample.
+        dict_size (int): The maximum size of the dictionary in bytes.
+
+    Returns:
+        int: The zstd id of the new dictionary.
+    """
+    rows = session.execute(
+        select(*(getattr(Review, field) for field in TEXT_FIELDS))
+        .order_by(func.random())
+        .limit(sample_size)
+    ).all()
+    samples = [text for row in rows for text in row if text]
+
+    data = train_dictionary(samples, dict_size)
+    dict_id = codec.add(data)
+    session.add(TextDictionary(dict_id=dict_id, data=data, created_at=datetime.now()))
+    session.commit()
+    return dict_id
+
+
+def recompress(session: Session, batch_size: int) -> int:
+    """
+    Rewrite the text fields of all reviews, one executemany UPDATE per batch.
+
+    Values are decoded on read and encoded on write, so the same pass compresses a plain text
+    database, recompresses with the newest dictionary, or decompresses when the codec is disabled.
+
+    Args:
+        session (Session): The database session.
+        batch_size (int): The number of reviews per batch.
+
+    Returns:
+        int: The number of reviews rewritten.
+    """
+    table = Review.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("_id"))
+        .values({field: bindparam(f"_{field}") for field in TEXT_FIELDS})
+    )
+
+    last_id, total = 0, 0
+    while True:
+        rows = session.execute(
+            select(table.c.id, *(table.c[field] for field in TEXT_FIELDS))
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        session.connection().execute(
+            stmt, [{"_id": row.id, **{f"_{field}": row._mapping[field] for field in TEXT_FIELDS}} for row in rows]
+        )
+        session.commit()
+
+        last_id, total = rows[-1].id, total + len(rows)
+        print(f"Rewrote {total} reviews")
+
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress review text of an existing database.")
+    parser.add_argument("--sample-size", type=int, default=5000, help="reviews sampled to train the dictionary")
+    parser.add_argument("--dict-size", type=int, default=112640, help="maximum dictionary size in bytes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="reviews rewritten per transaction")
+    parser.add_argument("--retrain", action="store_true", help="train a new dictionary even if one exists")
+    parser.add_argument("--decompress", action="store_true", help="store review text uncompressed again")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "sqlite":
+        sys.exit("Compressed text storage is only supported on SQLite")
+
+    TextDictionary.__table__.create(bind=engine, checkfirst=True)
+
+    # Indexes of compressed text would only keep a second copy of every value
+    if not args.decompress:
+        drop_text_indexes(engine)
+
+    with get_db() as session:
+        codec.load()
+        codec.enabled = not args.decompress
+
+        if codec.enabled and (args.retrain or not session.query(TextDictionary).count()):
+            dict_id = train(session, args.sample_size, args.dict_size)
+            print(f"Trained dictionary {dict_id}")
+
+        recompress(session, args.batch_size)
+
+    if args.decompress:
+        create_text_indexes(engine)
+
+    # Return the freed pages to the file system
+    reclaim_space(engine)
@@ -1,34 +1,163 @@
 import pandas as pd
 from dotenv import load_dotenv
+from sqlalchemy import select
 
+from typing import Any, Dict, Iterable, Iterator, List, Set
+import argparse
 import os
 import sys
 
 # Append the path to the sys.path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv()  # Load .env file
 
-from database import engine, Company, get_db
+from database import engine, Company, get_db, normalize_query, upsert_companies
 from scraper.utils import get_unique_companies
 
-# Create the Company table
-Company.__table__.create(bind=engine, checkfirst=True)
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed for Parquet input
+    pq = None
 
-# Load companies
-df = pd.read_csv(os.getenv("COMPANY_NAMES"))
+# Number of input rows read and written per transaction
+CHUNK_SIZE = 50_000
 
-# Keep the observation with the lowest tier for each gvkey and drop tier column
-df_unique = get_unique_companies(df)
+COLUMNS = {column.name for column in Company.__table__.columns}
 
-with get_db() as session:
 
-    # Iterate over DataFrame rows
-    for index, row in df_unique.iterrows():
-        # Create a Company object for each row
-        company = Company(**row.to_dict())
+def read_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV or Parquet file in chunks, so memory is bounded by one chunk whatever the size of the file.
 
-        # Add the Company object to the session
-        session.add(company)
+    Args:
+        path (str): The path of the file, read as Parquet if it ends with `.parquet` or `.pq`.
+        chunk_size (int): The number of rows per chunk.
 
-    # Commit the session to the database
-    session.commit()
+    Yields:
+        pd.DataFrame: The rows of one chunk.
+    """
+    if path.endswith((".parquet", ".pq")):
+        if pq is None:
+            raise ImportError("Reading Parquet files requires pyarrow, `pip install pyarrow`")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def check_columns(columns: Iterable[str]) -> None:
+    """
+    Checks that a file has the columns `prepare_chunk()` needs, before any of it is loaded.
+
+    Args:
+        columns (Iterable[str]): The column names of the file.
+
+    Raises:
+        ValueError: If a required column is missing.
+    """
+    columns = set(columns)
+    required = {"employer", "gvkey", "tier"} if "tier" in columns else {"employer_name"}
+    missing = sorted(required - columns)
+    if missing:
+        raise ValueError(f"Missing columns {missing}, found {sorted(columns)}")
+
+
+def prepare_chunk(df: pd.DataFrame, seen_names: Set[str], seen_gvkeys: Dict[int, Any]) -> List[Dict[str, Any]]:
+    """
+    Normalizes and de-duplicates the companies of one chunk.
+
+    Names are stripped of surrounding and repeated whitespace. A company is dropped if its normalized name was
+    already loaded, or if its GVKEY was already loaded with a lower or equal tier. A GVKEY seen again with a
+    lower tier replaces the earlier company.
+
+    Args:
+        df (pd.DataFrame): The chunk, with an `employer_name` column, or `employer` and `tier` columns which
+            are reduced with `get_unique_companies()`.
+        seen_names (Set[str]): The normalized names loaded so far, updated in place.
+        seen_gvkeys (Dict[int, Any]): The tier of each GVKEY loaded so far, updated in place.
+
+    Returns:
+        List[Dict[str, Any]]: The rows to upsert, with the columns of the company table only.
+    """
+    tiers = df["tier"] if "tier" in df.columns else None
+    if tiers is not None:
+        df = get_unique_companies(df).assign(tier=tiers)
+
+    df = df.assign(employer_name=df["employer_name"].astype("string").str.split().str.join(" "))
+    df = df[df["employer_name"].fillna("") != ""]
+    columns = [column for column in df.columns if column in COLUMNS]
+
+    rows = []
+    for row in df.to_dict("records"):
+        tier = row.get("tier")
+        row = {column: None if pd.isna(row[column]) else row[column] for column in columns}
+        key = normalize_query(row["employer_name"])
+
+        gvkey = row.get("gvkey")
+        if gvkey is not None:
+            row["gvkey"] = gvkey = int(gvkey)
+            if gvkey in seen_gvkeys:
+                if pd.isna(tier) or pd.isna(seen_gvkeys[gvkey]) or tier >= seen_gvkeys[gvkey]:
+                    continue
+            elif key in seen_names:
+                continue
+            seen_gvkeys[gvkey] = tier
+        elif key in seen_names:
+            continue
+
+        seen_names.add(key)
+        rows.append(row)
+    return rows
+
+
+def load_companies(path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Streams companies from a CSV or Parquet file into the company table, one transaction per chunk.
+
+    Companies with a GVKEY are upserted on it, so loading a file again updates its companies instead of
+    adding them twice. Companies without one are inserted unless a company of the same name exists.
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int): The number of rows read and written per transaction.
+
+    Returns:
+        int: The number of companies written.
+
+    Raises:
+        ValueError: If the file lacks a required column, see `check_columns()`.
+    """
+    with get_db() as session:
+        # Companies without a GVKEY are only known by name, so a second run must not insert them again
+        names = session.scalars(select(Company.employer_name).where(Company.gvkey.is_(None)))
+        seen_names = {normalize_query(name) for name in names if name}
+        seen_gvkeys: Dict[int, Any] = {}
+
+        total = 0
+        for i, df in enumerate(read_chunks(path, chunk_size)):
+            if i == 0:
+                check_columns(df.columns)
+            rows = prepare_chunk(df, seen_names, seen_gvkeys)
+            upsert_companies(session, rows, key="gvkey")
+            session.commit()
+            total += len(rows)
+
+            ########## Debug print statement ##########
+            print(f"Loaded {len(rows)} of {len(df)} rows from chunk {i + 1}, {total} companies in total")
+
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the company names of interest into the company table.")
+    parser.add_argument("path", nargs="?", default=os.getenv("COMPANY_NAMES"), help="CSV or Parquet file, defaults to COMPANY_NAMES")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows read and written per transaction")
+    args = parser.parse_args()
+
+    if not args.path:
+        sys.exit("No input file, pass a path or set COMPANY_NAMES")
+
+    # Create the Company table
+    Company.__table__.create(bind=engine, checkfirst=True)
+
+    load_companies(args.path, args.chunk_size)
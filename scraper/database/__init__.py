@@ -1,3 +1,9 @@
 from .base_models import CompanyBase, ReviewBase
 from .db_utils import get_db, engine
-from .models import Company, Review, Base
+from .models import Company, Review, TextDictionary, PageProgress, ScrapeJob, SearchCache, Base
+from .compression import codec, train_dictionary
+from .validation import validate_reviews, validate_overview
+from .writer import insert_reviews, update_companies, update_company_ids, upsert_companies
+from .progress import start_page, finish_page, fail_page, register_pages, load_progress, reset_progress
+from .search_cache import TypeaheadCache, normalize_query
+from .shared import KnownReviews, close_known_reviews, known_reviews, share_known_reviews
@@ -10,7 +10,7 @@ class CompanyBase(BaseModel):
 
     Attributes:
         employer_id (int): The ID of the employer.
-        employer_name (str): The name of the employer.
+        employer_name (Optional[str]): The name of the employer.
         number_of_pages (Optional[int]): The number of pages.
 
         all_reviews_count (Optional[int]): The count of all reviews.
@@ -31,7 +31,7 @@ class CompanyBase(BaseModel):
 
     # id: Optional[int] = None  # not required for new instances of CompanyBase
     employer_id: int
-    employer_name: str
+    employer_name: Optional[str] = None  # not parsed from the reviews page
     gvkey: Optional[int] = None
     is_gvkey: Optional[bool] = False
     id_not_found: Optional[bool] = False
@@ -0,0 +1,174 @@
+from sqlalchemy import String, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator
+
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+import os
+
+try:
+    import zstandard
+except ImportError:  # Compressed storage is optional
+    zstandard = None
+
+
+# Load environment variables
+load_dotenv()
+
+
+class TextCodec:
+    """
+    Compresses review text with zstd, using the newest dictionary trained on reviews of the database.
+
+    Dictionaries are stored in the `text_dictionary` table. Every compressed value records the id of
+    its dictionary (0 for none), so values compressed with older dictionaries stay readable.
+
+    Attributes:
+        enabled (bool): Whether new values are compressed, set by the `COMPRESS_TEXT` environment variable.
+        level (int): The zstd compression level, set by the `COMPRESS_LEVEL` environment variable.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = os.getenv("COMPRESS_TEXT", "0") == "1"
+        self.level = int(os.getenv("COMPRESS_LEVEL", 6))
+        self._engine: Optional[Engine] = None
+        self._dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self._compressor = None
+        self._decompressors: Dict[int, "zstandard.ZstdDecompressor"] = {}
+        self._loaded = False
+
+    def bind(self, engine: Engine) -> None:
+        """
+        Set the database the dictionaries are loaded from.
+        """
+        self._engine = engine
+        self._loaded = False
+
+    @property
+    def compresses(self) -> bool:
+        """
+        Whether new values are stored compressed, which only SQLite supports.
+        """
+        return self.enabled and (self._engine is None or self._engine.dialect.name == "sqlite")
+
+    def load(self) -> None:
+        """
+        Load all dictionaries from the database and compress with the newest one.
+        """
+        from .models import TextDictionary
+
+        self._require_zstandard()
+        self._loaded = True
+        if self._engine is None:
+            return
+
+        with self._engine.connect() as connection:
+            if not self._engine.dialect.has_table(connection, TextDictionary.__tablename__):
+                return
+            rows = connection.execute(
+                select(TextDictionary.data).order_by(TextDictionary.id)
+            ).all()
+
+        for (data,) in rows:
+            self.add(data)
+
+    def add(self, data: bytes) -> int:
+        """
+        Add a dictionary and compress new values with it.
+
+        Args:
+            data (bytes): The serialized dictionary, e.g. from `train_dictionary()`.
+
+        Returns:
+            int: The zstd id of the dictionary.
+        """
+        self._require_zstandard()
+        dictionary = zstandard.ZstdCompressionDict(data)
+        dict_id = dictionary.dict_id()
+        self._dictionaries[dict_id] = dictionary
+        self._decompressors.pop(dict_id, None)
+        self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        return dict_id
+
+    def compress(self, text: str) -> bytes | str:
+        """
+        Compress text, or return it unchanged if compressing would not make it smaller.
+        """
+        if self._compressor is None:
+            if not self._loaded:
+                self.load()
+            if self._compressor is None:
+                self._compressor = zstandard.ZstdCompressor(level=self.level)
+
+        raw = text.encode("utf-8")
+        compressed = self._compressor.compress(raw)
+        return compressed if len(compressed) < len(raw) else text
+
+    def decompress(self, blob: bytes) -> str:
+        """
+        Decompress a value written by `compress()`.
+        """
+        self._require_zstandard()
+        dict_id = zstandard.get_frame_parameters(blob).dict_id
+
+        if dict_id not in self._decompressors:
+            if dict_id and dict_id not in self._dictionaries:
+                self.load()
+            dictionary = self._dictionaries.get(dict_id) if dict_id else None
+            if dict_id and dictionary is None:
+                raise LookupError(f"No zstd dictionary with id {dict_id} in the database")
+            self._decompressors[dict_id] = (
+                zstandard.ZstdDecompressor(dict_data=dictionary)
+                if dictionary
+                else zstandard.ZstdDecompressor()
+            )
+
+        return self._decompressors[dict_id].decompress(blob).decode("utf-8")
+
+    @staticmethod
+    def _require_zstandard() -> None:
+        if zstandard is None:
+            raise ImportError("Compressed text storage requires the zstandard package")
+
+
+codec = TextCodec()
+
+
+class CompressedText(TypeDecorator):
+    """
+    A text column that is stored as a zstd BLOB when compression is enabled.
+
+    Only SQLite can keep text and BLOB values in the same column, so other databases always store text.
+    Reads decode compressed and uncompressed values alike.
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> bytes | str | None:
+        if value is None or not codec.enabled or dialect.name != "sqlite":
+            return value
+        return codec.compress(value)
+
+    def process_result_value(self, value: bytes | str | None, dialect) -> Optional[str]:
+        if isinstance(value, bytes):
+            return codec.decompress(value)
+        return value
+
+
+def train_dictionary(samples: List[str], dict_size: int = 112640) -> bytes:
+    """
+    Train a zstd dictionary on a sample of review texts.
+
+    Args:
+        samples (List[str]): The review texts to train on, a few thousand are usually enough.
+        dict_size (int): The maximum size of the dictionary in bytes. Defaults to 110 KiB.
+
+    Returns:
+        bytes: The serialized dictionary.
+    """
+    TextCodec._require_zstandard()
+    dictionary = zstandard.train_dictionary(
+        dict_size, [sample.encode("utf-8") for sample in samples if sample]
+    )
+    return dictionary.as_bytes()
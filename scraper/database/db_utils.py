@@ -1,8 +1,12 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from .compression import codec
+
 from contextlib import contextmanager
 from dotenv import load_dotenv
+from multiprocessing import util
 import os
 
 
@@ -10,12 +14,50 @@ import os
 load_dotenv()
 
 
+def create_db_engine(url: str | None = None) -> Engine:
+    """
+    Create the engine for the given database URL, SQLite or PostgreSQL.
+
+    Args:
+        url (str | None): The database connection string. Defaults to the `URL_DB` environment variable.
+
+    Returns:
+        Engine: The engine. SQLite connections may be used across threads, PostgreSQL connections
+        are pooled with the size set by `DB_POOL_SIZE` and `DB_MAX_OVERFLOW`.
+    """
+    url = make_url(url or os.environ.get("URL_DB"))
+
+    if url.get_backend_name() == "sqlite":
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    return create_engine(
+        url,
+        pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        pool_pre_ping=True,
+    )
+
+
 # Create the engine and session
-engine = create_engine(
-    os.environ.get("URL_DB"), connect_args={"check_same_thread": False}
-)
+engine = create_db_engine()
 SessionFactory = sessionmaker(autocommit=False, bind=engine)  # autoflush=False
 
+# Compressed review text is decoded with dictionaries stored in this database
+codec.bind(engine)
+
+def _after_fork() -> None:
+    """
+    Gives a forked worker process its own pool. The connections inherited from the parent, or none from the
+    forkserver, are forgotten without closing them, the parent still uses them. The worker's own connections
+    are closed when it exits.
+    """
+    engine.dispose(close=False)
+    util.Finalize(None, engine.dispose, exitpriority=0)
+
+
+# Pooled connections must not be shared with forked worker processes, each process opens its own
+os.register_at_fork(after_in_child=_after_fork)
+
 
 @contextmanager
 def get_db():
@@ -0,0 +1,120 @@
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from typing import List
+
+from .models import Review
+
+# The indexes of the review text, useless once the text is stored compressed
+TEXT_INDEXES = {f"ix_review_{field}" for field in ("pros", "cons", "summary", "advice")}
+
+
+def drop_stored_review_text(engine: Engine) -> bool:
+    """
+    Drops the stored `review_text` column and its index from an existing review table.
+
+    `Review.review_text` is computed from pros, cons, summary and advice on read, so the stored
+    copy only doubles the text stored per review and slows every insert.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+
+    Returns:
+        bool: True if the column was dropped, False if there was nothing to migrate.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("review"):
+        return False
+    if "review_text" not in {column["name"] for column in inspector.get_columns("review")}:
+        return False
+
+    with engine.begin() as connection:
+        # SQLite refuses to drop an indexed column, drop its indexes first
+        for index in inspector.get_indexes("review"):
+            if "review_text" in index["column_names"]:
+                connection.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+        connection.execute(text("ALTER TABLE review DROP COLUMN review_text"))
+
+    return True
+
+
+def drop_text_indexes(engine: Engine) -> List[str]:
+    """
+    Drops the indexes of pros, cons, summary and advice from an existing review table.
+
+    Once the text is compressed, no query can use them and each index only holds a second copy of every
+    compressed value.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+
+    Returns:
+        List[str]: The names of the indexes dropped.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("review"):
+        return []
+
+    dropped = [index["name"] for index in inspector.get_indexes("review") if index["name"] in TEXT_INDEXES]
+    with engine.begin() as connection:
+        for name in dropped:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+    return dropped
+
+
+def create_text_indexes(engine: Engine) -> None:
+    """
+    Creates the indexes of pros, cons, summary and advice again, once the text is stored uncompressed.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+    """
+    for index in Review.__table__.indexes:
+        if index.name in TEXT_INDEXES:
+            index.create(bind=engine, checkfirst=True)
+
+
+def add_missing_columns(engine: Engine, table: Table) -> List[str]:
+    """
+    Adds nullable columns of a model that an existing table does not have yet, with their indexes.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+        table (Table): The table of the model, e.g. `Company.__table__`.
+
+    Returns:
+        List[str]: The names of the columns added.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []
+
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing and column.nullable]
+
+    with engine.begin() as connection:
+        for column in missing:
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+            for index in table.indexes:
+                if column in index.columns.values():
+                    connection.execute(CreateIndex(index))
+
+    return [column.name for column in missing]
+
+
+def reclaim_space(engine: Engine) -> None:
+    """
+    Rewrites the database file so that space freed by migrations is returned to the file system.
+
+    Args:
+        engine (Engine): The engine of the database to compact.
+    """
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if engine.dialect.name == "sqlite":
+            connection.execute(text("VACUUM"))
+        elif engine.dialect.name == "postgresql":
+            connection.execute(text("VACUUM FULL review"))
@@ -6,10 +6,16 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
     Float,
-    event,
+    JSON,
+    LargeBinary,
+    UniqueConstraint,
+    func,
 )
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import declarative_base, relationship
 
+from .compression import CompressedText, codec
+
 # Create the base class for the models
 Base = declarative_base()
 
@@ -53,6 +59,9 @@ class Company(Base):
         business_outlook_rating (float): The rating for the business outlook of
             the company.
 
+        last_scraped_at (datetime): The date and time all review pages of the
+            company were last scraped.
+
         reviews (List[Review]): The reviews associated with the company.
     """
 
@@ -84,6 +93,8 @@ class Company(Base):
     compensation_and_benefits_rating = Column(Float, index=True)
     business_outlook_rating = Column(Float, index=True)
 
+    last_scraped_at = Column(DateTime, index=True, nullable=True)
+
     reviews = relationship("Review", back_populates="company")
 
 
@@ -96,7 +107,8 @@ class Review(Base):
         review_id (int): The identifier of the review.
         employer_id (int): The identifier of the employer associated with the review.
         date_time (datetime): The date and time when the review was created.
-        review_text (str): The text content of the review.
+        review_text (str): The text content of the review, computed from pros, cons, summary and advice
+            on read instead of being stored. It can be queried unless the text is stored compressed.
         rating_overall (int): The overall rating given by the reviewer.
         rating_ceo (str): The rating given to the CEO by the reviewer.
         rating_business_outlook (str): The rating given to the business outlook by the reviewer.
@@ -113,7 +125,8 @@ class Review(Base):
         job_ending_year (int): The year when the job ended for the reviewer.
         job_title (str): The job title of the reviewer.
         location (str): The location of the reviewer.
-        pros (str): The pros mentioned in the review.
+        pros (str): The pros mentioned in the review. Like cons, summary and advice, it is stored
+            compressed when `COMPRESS_TEXT=1` and decoded transparently on read.
         cons (str): The cons mentioned in the review.
         summary (str): The summary of the review.
         advice (str): The advice given in the review.
@@ -121,9 +134,6 @@ class Review(Base):
         count_not_helpful (int): The count of not helpful votes for the review.
         is_covid19 (bool): Indicates if the review is related to COVID-19.
         company (Company): The company associated with the review.
-
-    Methods:
-        __init__(**kwargs): Initializes a new instance of the Review class.
     """
     __tablename__ = "review"
 
@@ -131,8 +141,6 @@ class Review(Base):
     review_id = Column(Integer, index=True)
     employer_id = Column(Integer, ForeignKey("company.employer_id"), index=True)
     date_time = Column(DateTime, index=True)
-    
-    review_text = Column(String, index=True)
 
     rating_overall = Column(Float, index=True, nullable=True)
     rating_ceo = Column(String, index=True, nullable=True)
@@ -152,10 +160,10 @@ class Review(Base):
     job_title = Column(String, index=True, nullable=True)
     location = Column(String, index=True, nullable=True)
 
-    pros = Column(String, index=True, nullable=True)
-    cons = Column(String, index=True, nullable=True)
-    summary = Column(String, index=True, nullable=True)
-    advice = Column(String, index=True, nullable=True)
+    pros = Column(CompressedText, index=True, nullable=True)
+    cons = Column(CompressedText, index=True, nullable=True)
+    summary = Column(CompressedText, index=True, nullable=True)
+    advice = Column(CompressedText, index=True, nullable=True)
 
     count_helpful = Column(Integer, index=True, nullable=True)
     count_not_helpful = Column(Integer, index=True, nullable=True)
@@ -163,27 +171,123 @@ class Review(Base):
 
     company = relationship("Company", back_populates="reviews")
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.review_text = f"{self.pros} {self.cons} {self.summary} {self.advice}"
+    @hybrid_property
+    def review_text(self) -> str:
+        return " ".join(text or "" for text in (self.pros, self.cons, self.summary, self.advice))
 
+    @review_text.inplace.expression
+    @classmethod
+    def _review_text_expression(cls):
+        # Compressed values are zstd blobs, which SQL cannot decode
+        if codec.compresses:
+            raise NotImplementedError("Review.review_text cannot be queried while the review text is stored compressed")
+        return (
+            func.coalesce(cls.pros, "") + " " + func.coalesce(cls.cons, "") + " "
+            + func.coalesce(cls.summary, "") + " " + func.coalesce(cls.advice, "")
+        )
 
-# Listen for SQLAlchemy ORM events
-@event.listens_for(Review, "before_insert")
-@event.listens_for(Review, "before_update")
 
-# Define a function to concatenate the review fields automatically
-def concatenate_fields(mapper, connection, target) -> None:
+class TextDictionary(Base):
     """
-    Concatenates the fields 'pros', 'cons', 'summary', and 'advice' of the target object
-    and assigns the result to the 'review_text' attribute.
+    Represents a zstd dictionary used to compress review text.
+
+    Attributes:
+        id (int): The unique identifier of the dictionary.
+        dict_id (int): The zstd id of the dictionary, recorded in every value compressed with it.
+        data (bytes): The serialized dictionary.
+        created_at (datetime): The date and time the dictionary was trained.
+    """
+
+    __tablename__ = "text_dictionary"
+
+    id = Column(Integer, primary_key=True)
+    dict_id = Column(Integer, unique=True)
+    data = Column(LargeBinary)
+    created_at = Column(DateTime)
 
-    Args:
-        mapper: The mapper object.
-        connection: The connection object.
-        target: The target object.
 
-    Returns:
-        None
+class PageProgress(Base):
     """
-    target.review_text = f"{target.pros} {target.cons} {target.summary} {target.advice}"
+    Represents the scraping progress of one review page of an employer, used to resume interrupted runs.
+
+    Attributes:
+        id (int): The unique identifier of the row.
+        employer_id (int): The identifier of the employer.
+        page (int): The review page number.
+        status (str): One of "pending", "running", "done" or "failed".
+        attempts (int): The number of times the page was started.
+        last_error (str): The error of the last failed attempt.
+        overview (dict): The validated overview data, kept for page 1 only so that a resumed run can
+            finalize the company without scraping page 1 again.
+        started_at (datetime): The date and time the last attempt started.
+        finished_at (datetime): The date and time the page was done or failed.
+    """
+
+    __tablename__ = "page_progress"
+    __table_args__ = (UniqueConstraint("employer_id", "page"),)
+
+    id = Column(Integer, primary_key=True)
+    employer_id = Column(Integer, ForeignKey("company.employer_id"), index=True)
+    page = Column(Integer)
+    status = Column(String, index=True, default="pending")
+    attempts = Column(Integer, default=0)
+    last_error = Column(String, nullable=True)
+    overview = Column(JSON, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ScrapeJob(Base):
+    """
+    Represents a range of review pages queued for the workers of a distributed run.
+
+    A worker leases a job for a limited time and extends the lease with heartbeats while it works on it.
+    Jobs whose lease expired, e.g. because their node died, are leased again by another worker.
+
+    Attributes:
+        id (int): The unique identifier of the job.
+        employer_id (int): The identifier of the employer.
+        url_new (str): The reviews URL of the employer.
+        first_page (int): The first page of the range.
+        last_page (int): The last page of the range.
+        status (str): One of "queued", "leased", "done", "failed" or "collected".
+        worker (str): The worker holding the lease.
+        lease_expires_at (datetime): The date and time the lease expires without a heartbeat.
+        attempts (int): The number of times the job was leased.
+        result (dict): The overview and number of reviews stored, or the error of a failed job.
+        created_at (datetime): The date and time the job was queued.
+        finished_at (datetime): The date and time the job was done or failed.
+    """
+
+    __tablename__ = "scrape_job"
+
+    id = Column(Integer, primary_key=True)
+    employer_id = Column(Integer, ForeignKey("company.employer_id"), index=True)
+    url_new = Column(String)
+    first_page = Column(Integer)
+    last_page = Column(Integer)
+    status = Column(String, index=True, default="queued")
+    worker = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    result = Column(JSON, nullable=True)
+    created_at = Column(DateTime)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SearchCache(Base):
+    """
+    Represents the typeahead suggestions Glassdoor returned for a company name, so that names already
+    searched cost no proxy request.
+
+    Attributes:
+        query (str): The normalized company name, see `normalize_query()`.
+        suggestions (list): The suggestions returned by the typeahead endpoint.
+        fetched_at (datetime): The date and time the suggestions were fetched.
+    """
+
+    __tablename__ = "search_cache"
+
+    query = Column(String, primary_key=True)
+    suggestions = Column(JSON)
+    fetched_at = Column(DateTime, index=True)
@@ -0,0 +1,119 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+
+from typing import Any, Dict, Iterable, Optional
+from datetime import datetime
+
+from .models import PageProgress
+from .writer import upsert_insert
+
+
+def register_pages(session: Session, employer_id: int, pages: Iterable[int]) -> None:
+    """
+    Records pages of an employer as pending, pages that are already recorded are left as they are.
+
+    Args:
+        session (Session): The database session.
+        employer_id (int): The ID of the employer.
+        pages (Iterable[int]): The page numbers.
+    """
+    rows = [
+        {"employer_id": employer_id, "page": page, "status": "pending", "attempts": 0}
+        for page in pages
+    ]
+    if not rows:
+        return
+
+    stmt = upsert_insert(session)(PageProgress).on_conflict_do_nothing(
+        index_elements=[PageProgress.employer_id, PageProgress.page]
+    )
+    session.execute(stmt, rows)
+
+
+def start_page(session: Session, employer_id: int, page: int) -> None:
+    """
+    Marks a page as running and counts the attempt.
+
+    Args:
+        session (Session): The database session.
+        employer_id (int): The ID of the employer.
+        page (int): The page number.
+    """
+    now = datetime.now()
+    stmt = upsert_insert(session)(PageProgress).values(
+        employer_id=employer_id, page=page, status="running", attempts=1, started_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PageProgress.employer_id, PageProgress.page],
+        set_={"status": "running", "attempts": PageProgress.attempts + 1, "started_at": now},
+    )
+    session.execute(stmt)
+
+
+def finish_page(
+    session: Session, employer_id: int, page: int, overview: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Marks a page as done, in the same transaction as its reviews.
+
+    Args:
+        session (Session): The database session.
+        employer_id (int): The ID of the employer.
+        page (int): The page number.
+        overview (Optional[Dict[str, Any]]): The validated overview data of page 1.
+    """
+    session.execute(
+        update(PageProgress)
+        .where(PageProgress.employer_id == employer_id, PageProgress.page == page)
+        .values(status="done", last_error=None, overview=overview, finished_at=datetime.now())
+    )
+
+
+def fail_page(session: Session, employer_id: int, page: int, error: str) -> None:
+    """
+    Marks a page as failed with the error of the attempt.
+
+    Args:
+        session (Session): The database session.
+        employer_id (int): The ID of the employer.
+        page (int): The page number.
+        error (str): The error message.
+    """
+    session.execute(
+        update(PageProgress)
+        .where(PageProgress.employer_id == employer_id, PageProgress.page == page)
+        .values(status="failed", last_error=error, finished_at=datetime.now())
+    )
+
+
+def load_progress(session: Session) -> Dict[int, Dict[str, Any]]:
+    """
+    Loads the recorded progress of every employer.
+
+    Args:
+        session (Session): The database session.
+
+    Returns:
+        Dict[int, Dict[str, Any]]: For each employer ID, the status of each recorded page under "pages"
+        and the overview data saved with page 1 under "overview".
+    """
+    progress = {}
+    rows = session.execute(
+        select(PageProgress.employer_id, PageProgress.page, PageProgress.status, PageProgress.overview)
+    )
+    for employer_id, page, status, overview in rows:
+        employer = progress.setdefault(employer_id, {"pages": {}, "overview": None})
+        employer["pages"][page] = status
+        if page == 1 and status == "done":
+            employer["overview"] = overview
+    return progress
+
+
+def reset_progress(session: Session) -> None:
+    """
+    Forgets the progress of previous runs.
+
+    Args:
+        session (Session): The database session.
+    """
+    session.execute(delete(PageProgress))
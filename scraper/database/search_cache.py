@@ -0,0 +1,114 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from threading import Lock
+from dotenv import load_dotenv
+import unicodedata
+import os
+import re
+
+from .models import SearchCache
+from .writer import upsert_insert
+
+
+# Load environment variables
+load_dotenv()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a company name so that variants in case, accents, punctuation and spacing share one entry.
+    """
+    query = unicodedata.normalize("NFKD", query)
+    query = "".join(char for char in query if not unicodedata.combining(char))
+    query = re.sub(r"[^\w\s&]", " ", query.casefold())
+    return " ".join(query.split())
+
+
+class TypeaheadCache:
+    """
+    Caches typeahead suggestions by normalized company name in the `search_cache` table.
+
+    Entries are loaded once and looked up in memory. New entries are written in batches by `flush()`.
+
+    Attributes:
+        ttl (timedelta): How long suggestions are reused, set by `SEARCH_CACHE_TTL_DAYS`.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that need a request.
+    """
+
+    def __init__(self, ttl_days: Optional[float] = None) -> None:
+        self.ttl = timedelta(days=ttl_days if ttl_days is not None else float(os.getenv("SEARCH_CACHE_TTL_DAYS", 90)))
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[List[Dict[str, Any]], datetime]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = Lock()  # `flush()` may run in a writer thread while suggestions are put
+
+    def load(self, session: Session) -> None:
+        """
+        Loads the entries that have not expired.
+        """
+        rows = session.execute(
+            select(SearchCache.query, SearchCache.suggestions, SearchCache.fetched_at).where(
+                SearchCache.fetched_at >= datetime.now() - self.ttl
+            )
+        ).all()
+        self._entries = {query: (suggestions, fetched_at) for query, suggestions, fetched_at in rows}
+
+    def get(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the cached suggestions for a company name, or None if there are none or they expired.
+        """
+        entry = self._entries.get(normalize_query(query))
+        if entry is None or entry[1] < datetime.now() - self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def __contains__(self, query: str) -> bool:
+        """
+        Whether suggestions for a company name are cached and fresh, without counting a lookup.
+        """
+        entry = self._entries.get(normalize_query(query))
+        return entry is not None and entry[1] >= datetime.now() - self.ttl
+
+    def put(self, query: str, suggestions: List[Dict[str, Any]]) -> None:
+        """
+        Caches the suggestions for a company name, written to the database by the next `flush()`.
+        """
+        key, now = normalize_query(query), datetime.now()
+        self._entries[key] = (suggestions, now)
+        with self._lock:
+            self._pending[key] = {"query": key, "suggestions": suggestions, "fetched_at": now}
+
+    def flush(self, session: Session) -> None:
+        """
+        Writes the new entries in the session's transaction, the caller commits.
+        """
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+        if not pending:
+            return
+        stmt = upsert_insert(session)(SearchCache)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SearchCache.query],
+            set_={"suggestions": stmt.excluded.suggestions, "fetched_at": stmt.excluded.fetched_at},
+        )
+        session.execute(stmt, pending)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        The hits, misses, hit rate and size of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
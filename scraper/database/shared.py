@@ -0,0 +1,129 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing import resource_tracker, util
+from typing import Any, Dict, Iterable, Optional
+import sys
+from bisect import bisect_left
+from array import array
+
+from .models import Review
+
+
+class KnownReviews:
+    """
+    The sorted IDs of the reviews stored before the run, in shared memory that all worker processes read
+    without a copy of their own.
+
+    A refreshed employer's pages repeat reviews that are already stored, `store_page()` counts them and, with
+    SKIP_KNOWN_REVIEWS set, drops them before inserting. Lookups are binary searches over the 8-byte IDs.
+
+    Attributes:
+        name (str): The name of the shared memory block, to attach it in another process.
+    """
+
+    def __init__(self, memory: SharedMemory, size: int, owner: bool = False) -> None:
+        self._memory = memory
+        self._ids = memory.buf[:size * 8].cast("q")
+        self._owner = owner
+        self.name = memory.name
+
+    @classmethod
+    def load(cls, session: Session) -> "KnownReviews":
+        """
+        Reads the IDs of all stored reviews into a new shared memory block, owned by this process.
+        """
+        ids = array("q", session.scalars(
+            select(Review.review_id).where(Review.review_id.isnot(None)).distinct().order_by(Review.review_id)
+        ))
+        memory = SharedMemory(create=True, size=max(len(ids) * 8, 1))
+        memory.buf[:len(ids) * 8] = ids.tobytes()
+        return cls(memory, len(ids), owner=True)
+
+    @classmethod
+    def attach(cls, name: str, size: int) -> "KnownReviews":
+        """
+        Opens the block of another process, read only.
+        """
+        if sys.version_info >= (3, 13):
+            return cls(SharedMemory(name=name, track=False), size)
+
+        # Before Python 3.13 attaching registers the block with the resource tracker, which then warns about
+        # it or unlinks it under the owner. Only the process that created the block tracks it
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return cls(SharedMemory(name=name), size)
+        finally:
+            resource_tracker.register = register
+
+    def __contains__(self, review_id: Any) -> bool:
+        i = bisect_left(self._ids, review_id)
+        return i < len(self._ids) and self._ids[i] == review_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def filter(self, reviews: Iterable[Dict[str, Any]]) -> list:
+        """
+        Returns the reviews whose ID is not known.
+        """
+        return [review for review in reviews if review["review_id"] not in self]
+
+    def close(self) -> None:
+        """
+        Detaches from the block, and frees it if this process created it.
+        """
+        self._ids.release()
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+# The known reviews of the run, shared by the main process with its workers
+_known: Optional[KnownReviews] = None
+
+
+def share_known_reviews(session: Session) -> KnownReviews:
+    """
+    Loads the known reviews in the main process, before its worker processes are started.
+    """
+    global _known
+    _known = KnownReviews.load(session)
+    return _known
+
+
+def close_known_reviews() -> None:
+    """
+    Frees the known reviews once the worker processes are done.
+    """
+    global _known
+    if _known is not None:
+        _known.close()
+        _known = None
+
+
+def known_reviews() -> Optional[KnownReviews]:
+    """
+    The known reviews of the run, None if none were shared with this process.
+    """
+    return _known
+
+
+def settings() -> Dict[str, Any]:
+    """
+    The shared memory block of the known reviews, passed to the worker processes.
+    """
+    return {"name": _known.name, "size": len(_known)} if _known is not None else {}
+
+
+def apply_settings(settings: Dict[str, Any]) -> None:
+    """
+    Attaches the known reviews of the main process in a worker process, see `settings()`. The worker
+    detaches when it exits.
+    """
+    global _known
+    if settings and (_known is None or _known.name != settings["name"]):
+        _known = KnownReviews.attach(settings["name"], settings["size"])
+        util.Finalize(None, close_known_reviews, exitpriority=10)
@@ -0,0 +1,58 @@
+from pydantic import TypeAdapter, ValidationError
+
+from typing import Any, Dict, List, Tuple
+
+from .base_models import CompanyBase, ReviewBase
+
+
+# Built once per process, validating a whole page of reviews is one call into pydantic-core
+review_list_adapter = TypeAdapter(List[ReviewBase])
+
+
+def validate_reviews(
+    reviews: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], ValidationError]]]:
+    """
+    Validates a batch of parsed reviews and returns plain dictionaries ready for the writer.
+
+    Args:
+        reviews (List[Dict[str, Any]]): The parsed reviews, e.g. the values of `parse_reviews()`.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], ValidationError]]]: The valid reviews as
+        dictionaries (without the autoincrement `id`), and the invalid reviews paired with their own
+        validation error so they can be reported one by one.
+    """
+    invalid = []
+    try:
+        valid = review_list_adapter.validate_python(reviews)
+    except ValidationError as e:
+        # Errors are located by list index, revalidate only the failing reviews to get one error per review
+        bad_indices = {error["loc"][0] for error in e.errors()}
+        for index in sorted(bad_indices):
+            try:
+                ReviewBase.model_validate(reviews[index])
+            except ValidationError as review_error:
+                invalid.append((reviews[index], review_error))
+
+        reviews = [review for index, review in enumerate(reviews) if index not in bad_indices]
+        valid = review_list_adapter.validate_python(reviews)
+
+    return review_list_adapter.dump_python(valid, exclude={"__all__": {"id"}}), invalid
+
+
+def validate_overview(overview: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validates parsed overview data and returns only the fields that were scraped.
+
+    Args:
+        overview (Dict[str, Any]): The parsed overview, e.g. the output of `parse_overview()`.
+
+    Returns:
+        Dict[str, Any]: The validated overview fields. Defaults of `CompanyBase` are left out so that
+        existing columns such as `url_new` or `ticker` are not overwritten.
+
+    Raises:
+        ValidationError: If the overview data is invalid.
+    """
+    return CompanyBase.model_validate(overview).model_dump(exclude_unset=True)
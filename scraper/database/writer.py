@@ -0,0 +1,207 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, func, insert, select, update
+
+from typing import Any, Callable, Dict, List, Tuple
+from datetime import datetime
+import io
+
+from .models import Company, Review
+
+
+def _copy_value(value: Any) -> str:
+    """
+    Format a value for PostgreSQL's COPY text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_reviews(session: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Streams reviews into PostgreSQL with COPY FROM STDIN on the session's connection.
+    """
+    columns = [column.name for column in Review.__table__.columns if column.name != "id"]
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row.get(column)) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    statement = f"COPY {Review.__tablename__} ({', '.join(columns)}) FROM STDIN"
+    dbapi = session.get_bind().dialect.loaded_dbapi
+    dbapi_connection = session.connection().connection.dbapi_connection
+    try:
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(statement, buffer)
+    except dbapi.Error as e:
+        # Raise what an INSERT would, e.g. IntegrityError for a constraint
+        raise DBAPIError.instance(statement, None, e, dbapi.Error) from e
+
+
+def insert_reviews(session: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Inserts validated reviews in bulk, with COPY on PostgreSQL and a single executemany INSERT otherwise.
+
+    Args:
+        session (Session): The database session.
+        rows (List[Dict[str, Any]]): The validated reviews, e.g. from `validate_reviews()`.
+            Each row must already carry its `employer_id`.
+
+    Returns:
+        int: The number of reviews inserted.
+    """
+    if not rows:
+        return 0
+
+    if session.get_bind().dialect.name == "postgresql":
+        _copy_reviews(session, rows)
+    else:
+        session.execute(insert(Review), rows)
+    return len(rows)
+
+
+def upsert_insert(session: Session) -> Callable:
+    """
+    Returns the INSERT construct of the session's dialect, which supports ON CONFLICT.
+
+    Args:
+        session (Session): The database session.
+
+    Returns:
+        Callable: `insert` of the PostgreSQL or SQLite dialect.
+
+    Raises:
+        NotImplementedError: If the database is neither PostgreSQL nor SQLite.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Upserts are not supported for {dialect}")
+
+
+def upsert_companies(session: Session, rows: List[Dict[str, Any]], key: str = "employer_id") -> int:
+    """
+    Inserts companies, or updates the given fields of companies that already exist, with ON CONFLICT.
+
+    Args:
+        session (Session): The database session.
+        rows (List[Dict[str, Any]]): The company fields, each row must carry its `employer_id`, or the
+            unique `key` column. Rows without a value for `key` are inserted as new companies.
+        key (str): The unique column that identifies existing companies, `employer_id` or `gvkey`.
+
+    Returns:
+        int: The number of rows sent to the database.
+    """
+    dialect_insert = upsert_insert(session)
+
+    # executemany needs the same columns in every row, so group rows by the fields they set
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    for columns, group in groups.items():
+        stmt = dialect_insert(Company)
+        set_ = {column: stmt.excluded[column] for column in columns if column not in ("employer_id", key)}
+        if set_:
+            stmt = stmt.on_conflict_do_update(index_elements=[Company.__table__.c[key]], set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[Company.__table__.c[key]])
+        session.execute(stmt, group)
+
+    return len(rows)
+
+
+def update_companies(session: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Updates many company rows by primary key with executemany UPDATEs, one per set of updated fields.
+
+    Args:
+        session (Session): The database session.
+        rows (List[Dict[str, Any]]): The fields to update, e.g. validated overviews from `validate_overview()`
+            or `{"employer_id": ..., "url_new": ...}` mappings. Each row must carry its `employer_id`.
+            A missing `employer_name` is never written over an existing one.
+
+    Returns:
+        int: The number of rows sent to the database.
+    """
+    rows = [
+        {
+            key: value
+            for key, value in row.items()
+            if not (key == "employer_name" and value is None)
+        }
+        for row in rows
+    ]
+    rows = [row for row in rows if len(row) > 1]
+    if not rows:
+        return 0
+
+    # ORM bulk UPDATE by primary key, rows setting the same fields share one executemany
+    session.execute(update(Company), rows)
+    return len(rows)
+
+
+def update_company_ids(session: Session, rows: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Replaces the employer ID and name of many company rows with the ones resolved on Glassdoor, with one
+    executemany UPDATE.
+
+    Args:
+        session (Session): The database session.
+        rows (List[Dict[str, Any]]): The resolved companies, `{"old_employer_id": ..., "employer_id": ...,
+            "employer_name": ..., "query": ...}` mappings where `old_employer_id` is the current primary key
+            and `query` the name that was resolved, which marks the company as resolved.
+
+    Returns:
+        Tuple[int, List[Dict[str, Any]]]: The number of rows updated, and the rows skipped because another
+        company already has their employer ID.
+    """
+    new_ids = {row["employer_id"] for row in rows}
+    taken = set(session.scalars(select(Company.employer_id).where(Company.employer_id.in_(new_ids))))
+
+    updates, skipped = [], []
+    for row in rows:
+        if row["employer_id"] != row["old_employer_id"] and row["employer_id"] in taken:
+            skipped.append(row)
+            continue
+        taken.add(row["employer_id"])
+        updates.append(
+            {
+                "_old_employer_id": row["old_employer_id"],
+                "_employer_id": row["employer_id"],
+                "_employer_name": row["employer_name"],
+                "_query": row["query"],
+            }
+        )
+    if not updates:
+        return 0, skipped
+
+    table = Company.__table__
+    stmt = (
+        update(table)
+        .where(table.c.employer_id == bindparam("_old_employer_id"))
+        .values(
+            employer_id=bindparam("_employer_id"),
+            employer_name=bindparam("_employer_name"),
+            # Keep the name a company was first resolved from
+            query=func.coalesce(func.nullif(table.c.query, ""), bindparam("_query")),
+        )
+    )
+    session.connection().execute(stmt, updates)
+    return len(updates), skipped
@@ -0,0 +1,289 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Event as ProcessEvent, Pool
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+
+from database import get_db, start_page
+from glassdoor import async_client, review_page_url
+from jobs import Broker
+from metrics import inc, set_labels, timer
+from tracing import add_event, set_employer, span
+from tasks import PageTask, init_worker, parse_page_task, record_failure, scrape_and_store, store_page
+from bootstrap import worker_state
+from profiling import checkpoint, snapshot_memory, start as start_profiling, stop as stop_profiling
+from log import logger
+
+if TYPE_CHECKING:  # Imported by the asyncio engine only, the pool's main process does not fetch
+    import httpx
+
+Callback = Callable[[Dict[str, Any]], None]
+ErrorCallback = Callable[[BaseException], None]
+
+
+class PoolEngine:
+    """
+    Runs each task in one of a pool of worker processes, which fetch, parse and store its pages in turn.
+
+    Attributes:
+        capacity (int): The number of tasks run at once, one per worker process.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.capacity = workers
+        self._stop = ProcessEvent()
+        self._pool = Pool(workers, initializer=init_worker, initargs=(self._stop, worker_state()))
+
+    def submit(self, task: PageTask, callback: Callback, error_callback: ErrorCallback) -> None:
+        """
+        Starts a task, `callback` receives the result of `scrape_and_store()`.
+        """
+        self._pool.apply_async(scrape_and_store, (task,), callback=callback, error_callback=error_callback)
+
+    def stop(self) -> None:
+        """
+        Asks the workers to stop after the page in progress, their tasks return as stopped.
+        """
+        self._stop.set()
+
+    def __enter__(self) -> "PoolEngine":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._pool.terminate()
+        self._pool.join()
+
+
+class AsyncEngine:
+    """
+    Fetches pages of many tasks concurrently on an asyncio event loop in a background thread.
+
+    Fetching a page is waiting on the proxy service, so one process keeps hundreds of requests open. Parsing
+    the HTML is CPU-bound and runs in a small pool of processes, and pages are stored one at a time by a
+    single writer thread, so the database sees no more connections than with one worker.
+
+    Attributes:
+        capacity (int): The number of tasks run at once, set by `SCRAPE_CONCURRENCY`.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, parse_workers: Optional[int] = None) -> None:
+        self.capacity = concurrency or int(os.getenv("SCRAPE_CONCURRENCY", 100))
+        self._parsers = ProcessPoolExecutor(
+            parse_workers or int(os.getenv("PARSE_WORKERS", min(os.cpu_count() or 1, 4))),
+            initializer=init_worker,
+            initargs=(None, worker_state()),
+        )
+        self._writer = ThreadPoolExecutor(1)
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._stop = Event()
+
+    def submit(self, task: PageTask, callback: Callback, error_callback: ErrorCallback) -> None:
+        """
+        Starts a task, `callback` receives a result shaped like the one of `scrape_and_store()`.
+        """
+        def done(future: Future) -> None:
+            if future.cancelled():
+                return  # The engine is closing
+            if future.exception() is not None:
+                error_callback(future.exception())
+            else:
+                callback(future.result())
+
+        asyncio.run_coroutine_threadsafe(self._scrape_and_store(task), self._loop).add_done_callback(done)
+
+    def stop(self) -> None:
+        """
+        Stops starting pages, the tasks return as stopped after the pages in progress.
+        """
+        self._stop.set()
+
+    async def _scrape_and_store(self, task: PageTask) -> Dict[str, Any]:
+        result = {"task": task, "overview": None, "reviews": 0}
+        loop = asyncio.get_running_loop()
+        # This task's own context, the spans and fetches of other tasks are not tagged
+        set_labels(employer=task.employer_id)
+        set_employer(task.employer_id)
+
+        for page in range(task.first_page, task.last_page + 1):
+            if self._stop.is_set():
+                result["stopped"] = True
+                break  # Leave the other pages pending for --resume
+
+            url = review_page_url(task.url_new, page)
+            with span("page", employer_id=task.employer_id, page=page) as page_span:
+                await loop.run_in_executor(self._writer, self._start_page, task, page)
+
+                with timer("fetch"), span("fetch", url=url) as fetch_span:
+                    html = await self._fetch(url)
+                    if html is None:
+                        fetch_span.set_error("Request failed")
+                    else:
+                        fetch_span.attributes["bytes"] = len(html)
+                        inc("scrape_response_bytes_total", len(html))
+
+                overview_data, reviews_data, error = {}, {}, None
+                if html is not None:
+                    try:
+                        # Includes the wait for a free parser process
+                        with span("parse"):
+                            overview_data, reviews_data = await loop.run_in_executor(self._parsers, parse_page_task, html, url)
+                    except Exception as e:
+                        # Any error fails this page only, the task goes on with the next one
+                        error = f"Error scraping data: {e}"
+
+                # Includes the wait for the writer thread
+                with span("write"):
+                    stored = await loop.run_in_executor(
+                        self._writer, self._store_page, task, page, overview_data, reviews_data, error
+                    )
+                if stored is None:
+                    page_span.set_error(error or "Page not stored")
+                    inc("scrape_page_errors_total")
+                else:
+                    page_span.attributes["reviews"] = stored[0]
+                    inc("scrape_pages_total")
+                    inc("scrape_reviews_total", stored[0])
+                    result["reviews"] += stored[0]
+                    result["overview"] = stored[1] or result["overview"]
+
+            # Add a delay, like the blocking scraper
+            await asyncio.sleep(1)
+
+        snapshot_memory(task.employer_id)
+        checkpoint()
+        return result
+
+    async def _fetch(self, url: str) -> str | None:
+        """
+        Fetches a page with the retry policy of `glassdoor.fetch_html()`, without blocking the loop.
+        """
+        import httpx
+
+        http_attempts, max_http_attempts = 0, 10
+        network_attempts, max_network_attempts = 0, 60
+        while http_attempts < max_http_attempts and network_attempts < max_network_attempts:
+            try:
+                response = await self._client.get(url)
+                response.raise_for_status()
+                return response.text
+            except httpx.HTTPStatusError as e:
+                logger.error(f'HTTP error: {e}', extra={"status_code": e.response.status_code, "URL": url})
+                http_attempts += 1
+                add_event("retry", attempt=http_attempts, error=str(e), status_code=e.response.status_code)
+                await asyncio.sleep(1)
+            except (httpx.TransportError, httpx.TooManyRedirects) as e:
+                logger.error(f'Network error: {e}', extra={"status_code": 'No response code', "URL": url})
+                network_attempts += 1
+                add_event("retry", attempt=network_attempts, error=str(e))
+                await asyncio.sleep(30)
+            except httpx.HTTPError as e:
+                logger.error(f'Other request error: {e}', extra={"status_code": 'No response code', "URL": url})
+                return None
+        return None
+
+    @staticmethod
+    def _start_page(task: PageTask, page: int) -> None:
+        with get_db() as session:
+            start_page(session, task.employer_id, page)
+            session.commit()
+
+    @staticmethod
+    def _store_page(
+        task: PageTask, page: int, overview_data: dict, reviews_data: dict, error: Optional[str]
+    ) -> Optional[Tuple[int, Optional[dict]]]:
+        with get_db() as session:
+            if error is not None:
+                record_failure(session, task, page, error)
+                return None
+            try:
+                return store_page(session, task, page, overview_data, reviews_data)
+            except Exception as e:
+                record_failure(session, task, page, f"Error storing data: {e}")
+                return None
+
+    async def _open(self) -> None:
+        self._client = async_client(self.capacity)
+        start_profiling("asyncio")  # The event loop's thread, the parser processes profile themselves
+
+    async def _close(self) -> None:
+        # Cancel the tasks that are still running when the run's budget is spent
+        for pending in asyncio.all_tasks() - {asyncio.current_task()}:
+            pending.cancel()
+        await self._client.aclose()
+        stop_profiling()
+
+    def __enter__(self) -> "AsyncEngine":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._writer.shutdown()
+        self._parsers.shutdown()
+
+
+class BrokerEngine:
+    """
+    Queues tasks with a broker for the workers of other nodes, `worker.py`, and reports their results.
+
+    Attributes:
+        capacity (int): The number of tasks queued or running at once, set by `JOB_QUEUE_DEPTH`. Tasks are
+            queued in order of priority, so a small queue keeps the budget for the most valuable pages.
+    """
+
+    def __init__(self, broker: Broker, capacity: Optional[int] = None, poll_seconds: Optional[float] = None) -> None:
+        self.capacity = capacity or int(os.getenv("JOB_QUEUE_DEPTH", 1000))
+        self._broker = broker
+        self._poll_seconds = poll_seconds or float(os.getenv("JOB_POLL_SECONDS", 2))
+        self._callbacks: Dict[int, Tuple[PageTask, Callback, ErrorCallback]] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = Thread(target=self._poll, daemon=True)
+
+    def submit(self, task: PageTask, callback: Callback, error_callback: ErrorCallback) -> None:
+        """
+        Queues a task, `callback` receives a result shaped like the one of `scrape_and_store()`.
+        """
+        with self._lock:
+            self._callbacks[self._broker.put(task)] = (task, callback, error_callback)
+
+    def stop(self) -> None:
+        """
+        Withdraws the jobs no worker leased yet, they return as stopped. Leased jobs are finished by their workers.
+        """
+        with self._lock:
+            withdrawn = [self._callbacks.pop(job_id) for job_id in self._broker.clear("queued") if job_id in self._callbacks]
+        for task, callback, _ in withdrawn:
+            callback({"task": task, "overview": None, "reviews": 0, "stopped": True})
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self._poll_seconds):
+            for finished in self._broker.collect():
+                with self._lock:
+                    callbacks = self._callbacks.pop(finished.job.id, None)
+                if callbacks is None:
+                    continue  # Queued by an earlier run
+
+                _, callback, error_callback = callbacks
+                if finished.status == "done":
+                    callback({"task": finished.job.task, "overview": finished.result.get("overview"), "reviews": finished.result.get("reviews", 0)})
+                else:
+                    error_callback(RuntimeError(finished.result.get("error")))
+
+    def __enter__(self) -> "BrokerEngine":
+        # Forget the jobs of an earlier coordinator, the progress table knows which pages it finished
+        self._broker.clear()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._broker.clear("queued")
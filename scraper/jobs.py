@@ -0,0 +1,304 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, List, NamedTuple, Optional
+import os
+
+from database import ScrapeJob, get_db
+from tasks import PageTask
+from log import logger
+
+# Seconds a leased job stays with its worker without a heartbeat
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+
+# Number of times a job is leased before it is given up
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+
+class Job(NamedTuple):
+    """
+    A queued task and the ID the broker knows it by.
+    """
+
+    id: int
+    task: PageTask
+
+
+class Finished(NamedTuple):
+    """
+    A job that is done or failed, as reported to the coordinator.
+    """
+
+    job: Job
+    status: str
+    result: Dict[str, Any]
+
+
+class Broker(ABC):
+    """
+    Queues the tasks of a distributed run and leases them to workers.
+
+    A lease expires unless the worker sends heartbeats, and expired jobs are leased again, so a job whose node
+    died is finished by another worker. A job that fails or expires `max_attempts` times is given up.
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS) -> None:
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def put(self, task: PageTask) -> int:
+        """
+        Queues a task and returns the ID of its job.
+        """
+
+    @abstractmethod
+    def lease(self, worker: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Job]:
+        """
+        Leases the oldest queued job to a worker, after requeueing the jobs whose lease expired.
+
+        Returns:
+            Optional[Job]: The job, or None if no job is queued.
+        """
+
+    @abstractmethod
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        """
+        Extends the lease of a job. Returns False if the worker lost the lease.
+        """
+
+    @abstractmethod
+    def complete(self, job_id: int, worker: str, result: Dict[str, Any]) -> bool:
+        """
+        Marks a leased job as done with its result. Returns False if the worker lost the lease.
+        """
+
+    @abstractmethod
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """
+        Requeues a leased job after an error, or marks it as failed after `max_attempts`. Returns False if the
+        worker lost the lease.
+        """
+
+    @abstractmethod
+    def collect(self) -> List[Finished]:
+        """
+        Takes the jobs that are done or failed since the last call, for the coordinator.
+        """
+
+    @abstractmethod
+    def clear(self, status: Optional[str] = None) -> List[int]:
+        """
+        Deletes all jobs, or the jobs with the given status, and returns their IDs.
+        """
+
+
+class MemoryBroker(Broker):
+    """
+    A broker in the memory of one process, for workers in threads of the coordinator and for tests.
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS) -> None:
+        super().__init__(max_attempts)
+        self._jobs: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 1
+        self._lock = Lock()
+
+    def put(self, task: PageTask) -> int:
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._jobs[job_id] = {"task": task, "status": "queued", "worker": None, "lease_expires_at": None, "attempts": 0, "result": None}
+            return job_id
+
+    def lease(self, worker: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Job]:
+        now = datetime.now()
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == "leased" and job["lease_expires_at"] < now:
+                    self._requeue(job, "Lease expired")
+
+            for job_id, job in self._jobs.items():
+                if job["status"] == "queued":
+                    job.update(status="leased", worker=worker, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                    job["attempts"] += 1
+                    return Job(job_id, job["task"])
+        return None
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        with self._lock:
+            job = self._leased(job_id, worker)
+            if job is None:
+                return False
+            job["lease_expires_at"] = datetime.now() + timedelta(seconds=lease_seconds)
+            return True
+
+    def complete(self, job_id: int, worker: str, result: Dict[str, Any]) -> bool:
+        with self._lock:
+            job = self._leased(job_id, worker)
+            if job is None:
+                return False
+            job.update(status="done", worker=None, lease_expires_at=None, result=result)
+            return True
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        with self._lock:
+            job = self._leased(job_id, worker)
+            if job is None:
+                return False
+            self._requeue(job, error)
+            return True
+
+    def collect(self) -> List[Finished]:
+        finished = []
+        with self._lock:
+            for job_id, job in self._jobs.items():
+                if job["status"] in ("done", "failed"):
+                    finished.append(Finished(Job(job_id, job["task"]), job["status"], job["result"]))
+                    job["status"] = "collected"
+        return finished
+
+    def clear(self, status: Optional[str] = None) -> List[int]:
+        with self._lock:
+            cleared = [job_id for job_id, job in self._jobs.items() if status is None or job["status"] == status]
+            for job_id in cleared:
+                del self._jobs[job_id]
+            return cleared
+
+    def _leased(self, job_id: int, worker: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] != "leased" or job["worker"] != worker:
+            return None
+        return job
+
+    def _requeue(self, job: Dict[str, Any], error: str) -> None:
+        if job["attempts"] >= self.max_attempts:
+            job.update(status="failed", result={"error": error})
+        else:
+            job["status"] = "queued"
+        job.update(worker=None, lease_expires_at=None)
+
+
+class DatabaseBroker(Broker):
+    """
+    A broker backed by the `scrape_job` table of the configured database, shared by the coordinator and the
+    workers on all nodes. On PostgreSQL, workers skip the jobs other workers are leasing instead of waiting
+    for them.
+    """
+
+    def put(self, task: PageTask) -> int:
+        with get_db() as session:
+            job = ScrapeJob(**task._asdict(), status="queued", attempts=0, created_at=datetime.now())
+            session.add(job)
+            session.commit()
+            return job.id
+
+    def lease(self, worker: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Job]:
+        now = datetime.now()
+        with get_db() as session:
+            self._requeue_expired(session, now)
+            session.commit()
+
+            candidates = session.scalars(
+                select(ScrapeJob.id)
+                .where(ScrapeJob.status == "queued")
+                .order_by(ScrapeJob.id)
+                .limit(8)
+                .with_for_update(skip_locked=True)
+            ).all()
+
+            # Another worker may lease the same job in between, only the first update matches
+            for job_id in candidates:
+                claimed = session.execute(
+                    update(ScrapeJob)
+                    .where(ScrapeJob.id == job_id, ScrapeJob.status == "queued")
+                    .values(
+                        status="leased",
+                        worker=worker,
+                        lease_expires_at=now + timedelta(seconds=lease_seconds),
+                        attempts=ScrapeJob.attempts + 1,
+                    )
+                )
+                if claimed.rowcount:
+                    job = session.get(ScrapeJob, job_id)
+                    session.commit()
+                    return Job(job.id, PageTask(job.employer_id, job.url_new, job.first_page, job.last_page))
+
+            session.commit()
+        return None
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        return self._update_leased(job_id, worker, lease_expires_at=datetime.now() + timedelta(seconds=lease_seconds))
+
+    def complete(self, job_id: int, worker: str, result: Dict[str, Any]) -> bool:
+        return self._update_leased(
+            job_id, worker, status="done", lease_expires_at=None, result=result, finished_at=datetime.now()
+        )
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        with get_db() as session:
+            leased = (ScrapeJob.id == job_id, ScrapeJob.worker == worker, ScrapeJob.status == "leased")
+            given_up = session.execute(
+                update(ScrapeJob)
+                .where(*leased, ScrapeJob.attempts >= self.max_attempts)
+                .values(status="failed", lease_expires_at=None, result={"error": error}, finished_at=datetime.now())
+            )
+            requeued = session.execute(
+                update(ScrapeJob).where(*leased).values(status="queued", worker=None, lease_expires_at=None)
+            )
+            session.commit()
+            return bool(given_up.rowcount or requeued.rowcount)
+
+    def collect(self) -> List[Finished]:
+        with get_db() as session:
+            jobs = session.scalars(
+                select(ScrapeJob).where(ScrapeJob.status.in_(("done", "failed"))).order_by(ScrapeJob.id)
+            ).all()
+            finished = [
+                Finished(
+                    Job(job.id, PageTask(job.employer_id, job.url_new, job.first_page, job.last_page)),
+                    job.status,
+                    job.result or {},
+                )
+                for job in jobs
+            ]
+            if jobs:
+                session.execute(
+                    update(ScrapeJob).where(ScrapeJob.id.in_([job.id for job in jobs])).values(status="collected")
+                )
+                session.commit()
+        return finished
+
+    def clear(self, status: Optional[str] = None) -> List[int]:
+        with get_db() as session:
+            stmt = delete(ScrapeJob).returning(ScrapeJob.id)
+            if status is not None:
+                stmt = stmt.where(ScrapeJob.status == status)
+            cleared = session.scalars(stmt).all()
+            session.commit()
+            return cleared
+
+    def _update_leased(self, job_id: int, worker: str, **values: Any) -> bool:
+        with get_db() as session:
+            updated = session.execute(
+                update(ScrapeJob)
+                .where(ScrapeJob.id == job_id, ScrapeJob.worker == worker, ScrapeJob.status == "leased")
+                .values(**values)
+            )
+            session.commit()
+            return bool(updated.rowcount)
+
+    def _requeue_expired(self, session: Session, now: datetime) -> None:
+        expired = (ScrapeJob.status == "leased", ScrapeJob.lease_expires_at < now)
+        session.execute(
+            update(ScrapeJob)
+            .where(*expired, ScrapeJob.attempts >= self.max_attempts)
+            .values(status="failed", lease_expires_at=None, result={"error": "Lease expired"}, finished_at=now)
+        )
+        requeued = session.execute(
+            update(ScrapeJob).where(*expired).values(status="queued", worker=None, lease_expires_at=None)
+        )
+        if requeued.rowcount:
+            logger.warning(f"Requeued {requeued.rowcount} jobs whose lease expired")
@@ -1,236 +1,453 @@
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from sqlalchemy.engine import Row
-from sqlalchemy import or_
-from pydantic import ValidationError
-
-from multiprocessing import Pool, cpu_count
-from logging.handlers import QueueHandler, QueueListener
-from typing import List
-from time import process_time 
-import json
-
-from database import Company, Review, CompanyBase, ReviewBase, get_db, engine
-from glassdoor import scrape_data  # play with relative imports
-from log import logger, setup_logging, get_queue
-
-
-def get_all_urls(session: Session) -> List[Row]:
+from sqlalchemy import func, or_
+
+from multiprocessing import cpu_count
+from contextlib import contextmanager
+from threading import Event, Thread, current_thread, main_thread
+from typing import Iterator, List, Optional, Tuple
+from queue import Empty, Queue
+from time import monotonic, perf_counter, process_time
+from datetime import datetime
+import argparse
+import asyncio
+import signal
+import os
+
+from database import Company, Review, PageProgress, ScrapeJob, get_db, engine, update_companies
+from database import load_progress, reset_progress, close_known_reviews, share_known_reviews
+from database.migrations import add_missing_columns
+from engines import AsyncEngine, BrokerEngine, PoolEngine  # play with relative imports
+from jobs import DatabaseBroker
+from bootstrap import configure_workers
+from metrics import Collector
+from progress import Progress
+from profiling import configure as configure_profiling, report as profile_report
+from tracing import configure as configure_tracing, flush as flush_spans, start_employer, start_run
+from scheduler import ScheduleConfig, Scheduler, expected_cost, priority, select_employers
+from tasks import MAX_PAGES, SHUTDOWN_SECONDS, PageTask, split_pages, split_task
+from log import logger, setup_logging
+
+# Number of companies whose overview data is written per transaction
+COMPANY_BATCH_SIZE = 500
+
+# Number of companies resolved per transaction while scraping, small so that scraping starts within seconds
+FUSED_BATCH_SIZE = 20
+
+
+def get_all_urls(session: Session, employer_ids: Optional[List[int]] = None) -> List[Row]:
         """
         Retrieves list of company Glassdoor URLs from database.
 
         Args:
             session (Session): The database session.
+            employer_ids (Optional[List[int]]): Only retrieve these employers. Defaults to None, all employers.
 
         Returns:
-            List[Tuple[int, str]]: A list of tuples containing the gvkey and URL for each company.
+            List[Row]: A list of rows containing the employer ID, URL, number of pages, review count and
+            time of the last run, and the number of reviews stored for each company.
         """
-        ############# Testing #############
-        ticker_to_ids = {
-            'MSFT': 1651, 
-            'AAPL': 1138, 
-            'INTC': 1519, 
-            'NVDA': 7633, 
-            'MU': 1648, 
-            'META': 40772, 
-            'AMD': 15,
-            'GOOG': 9079,
-            'PLTR': 236375,
-        }
-        return (
-                session.query(Company.url_new)
+        stored_reviews = (
+            session.query(Review.employer_id, func.count(Review.id).label("stored_reviews"))
+            .group_by(Review.employer_id)
+            .subquery()
+        )
+        query = (
+                session.query(
+                    Company.employer_id,
+                    Company.url_new,
+                    Company.number_of_pages,
+                    Company.all_reviews_count,
+                    Company.last_scraped_at,
+                    stored_reviews.c.stored_reviews,
+                )
+                .outerjoin(stored_reviews, stored_reviews.c.employer_id == Company.employer_id)
                 .filter(
                     Company.url_new.isnot(None),   # Modify query for use case
-                    or_(Company.is_gvkey == 1, Company.ticker.isnot(None)),
-                    Company.employer_id.in_(ticker_to_ids.values())        ################ Remove for production ################
+                    or_(Company.is_gvkey.is_(True), Company.ticker.isnot(None)),
                 )
-                .all()
         )
+        if employer_ids is not None:
+            query = query.filter(Company.employer_id.in_(employer_ids))
+        return query.all()
 
 
-def scrape_and_store(urls: List[Row]) -> None:
-
-    ########## Debug print statement ########## 
-    print(f"Processing {len(urls)} URLs")
+def flush_companies(session: Session, pending_companies: List[dict]) -> None:
+    """
+    Writes queued company overview data in one transaction and empties the queue.
 
-    # Set up a QueueHandler for the logger in this worker process
-    queue = get_queue()
-    handler = QueueHandler(queue)
-    logger.addHandler(handler)
+    Args:
+        session (Session): The database session.
+        pending_companies (List[dict]): The validated overview data of each company.
+    """
+    if not pending_companies:
+        return
 
-    with get_db() as session:
-        for url in urls:
-            try:
-                overview_data, reviews_data = scrape_data(url.url_new, max_pages=600)  ################ Modify for production ################
-
-                ########## Debug print statement ##########
-                # print(f"Scraped data for {url}")
-
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.error(f"Error scraping data: {e}", extra={"url": url})
-                continue  # Skip to the next company if there is an error
-
-            # Validate the data with CompanyBase
-            try:
-                valid_data = CompanyBase(**overview_data)
+    try:
+        update_companies(session, pending_companies)
+        session.commit()
 
-                ########## Debug print statement ##########
-                print(f"Validated company data for {url}")
-
-            except ValidationError as e:
-                logger.error(
-                    f"Invalid data from {url}: {e}",
-                    extra={"overview": overview_data},
-                )
-                continue  # Skip to the next company if the data is invalid
-            try:
-                # Fetch the existing company from the database
-                company = (
-                    session.query(Company)
-                    .filter(Company.employer_id == valid_data.employer_id)
-                    .first()
-                )
-
-                # Update the company's fields with the new data
-                for key, value in valid_data.model_dump().items():
-                    # Skip updating employer_name if it's not in valid_data or if it's None
-                    if key == 'employer_name' and (key not in valid_data.__dict__ or valid_data.__dict__[key] is None):
-                        continue
-
-                    if key in valid_data.__dict__:
-
-                        ########## Debug print statement ##########
-                        # print(f"{key}: {type(value)}") 
-
-                        setattr(company, key, value)
-
-                session.commit()
-
-                ########## Debug print statement ##########
-                print(f"Committed company data for {url}")
-
-            except (IntegrityError, Exception) as e:
-                session.rollback()
-                logger.error(
-                    f"Error updating company data: {e}",
-                    extra={"url": url}, 
-                )
-                continue  # Skip to the next company if there is an error
-
-            # Initialize a counter
-            counter = 0
+        ########## Debug print statement ##########
+        print(f"Committed company data for {len(pending_companies)} companies")
 
-            # For each item in your scraped data...
-            for review in reviews_data.values():  
-                try:
-                    # Validate the data with ReviewBase
-                    valid_review = ReviewBase(**review)
+    except (IntegrityError, Exception) as e:
+        session.rollback()
+        logger.error(
+            f"Error updating company data: {e}",
+            extra={"employer_ids": [company["employer_id"] for company in pending_companies]}, 
+        )
+    pending_companies.clear()
+
+
+@contextmanager
+def shutdown_signals() -> Iterator[Event]:
+    """
+    Turns SIGINT and SIGTERM into a shutdown request while the run is in progress.
+
+    Yields:
+        Event: Set by the first signal. A second signal raises KeyboardInterrupt to stop at once.
+    """
+    shutdown = Event()
+    if current_thread() is not main_thread():
+        yield shutdown  # Signal handlers can only be set in the main thread
+        return
+
+    def request_shutdown(signum: int, frame) -> None:
+        if shutdown.is_set():
+            raise KeyboardInterrupt
+        print(f"Shutting down, finishing the pages in progress within {SHUTDOWN_SECONDS:.0f} seconds")
+        logger.warning("Shutdown requested", extra={"signal": signal.Signals(signum).name})
+        shutdown.set()
+
+    previous = {signum: signal.signal(signum, request_shutdown) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        yield shutdown
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+def resolve_companies(resolved: Queue, stop: Event) -> None:
+    """
+    Resolves the companies' employer IDs in this thread while the main thread scrapes them.
+
+    Args:
+        resolved (Queue): Receives the employer IDs of each batch once it is committed, and None when done.
+        stop (Event): Stops searching once set.
+    """
+    # Only runs with --resolve, the search client is not imported otherwise
+    from companies import find_all_companies
+
+    try:
+        with get_db() as db:
+            asyncio.run(find_all_companies(db, batch_size=FUSED_BATCH_SIZE, on_resolved=resolved.put, stop=stop))
+    except Exception as e:
+        logger.error(f"Error resolving companies: {e}")
+    finally:
+        resolved.put(None)
+
+
+def main(
+    resume: bool = False, config: ScheduleConfig | None = None, engine_name: str | None = None, resolve: bool = False
+) -> None:
+    """
+    Scrapes the employers from `get_all_urls()` with a pool of worker processes or the asyncio engine.
+
+    Args:
+        resume (bool): Skip the pages that an interrupted run already stored. Defaults to False, which
+            forgets the progress of previous runs and starts from scratch.
+        config (ScheduleConfig | None): Which employers to refresh first and the run's budgets.
+            Defaults to the configuration from the environment.
+        engine_name (str | None): "pool" for one worker process per core, "async" for many concurrent
+            fetches in one process, or "distributed" to queue the tasks for `worker.py` on other nodes.
+            Defaults to the `SCRAPE_ENGINE` environment variable, else "pool".
+        resolve (bool): Resolve the companies' employer IDs during the run, like `companies.py`, and scrape
+            each employer as soon as its batch is resolved instead of after all companies are.
+    """
+    config = config or ScheduleConfig.from_env()
+    engine_name = engine_name or os.getenv("SCRAPE_ENGINE", "pool")
+    now = datetime.now()
 
-                    ########## Debug print statement ##########
-                    # print(f"Validated review data for {url}")
+    Review.__table__.create(bind=engine, checkfirst=True) 
+    PageProgress.__table__.create(bind=engine, checkfirst=True)
+    ScrapeJob.__table__.create(bind=engine, checkfirst=True)
+    add_missing_columns(engine, Company.__table__)
 
-                except ValidationError as e:
-                    logger.error(
-                        f"Invalid data for review: {e}", extra={"review": review}
+    with get_db() as session:
+        # Most valuable and most stale employers first
+        urls = select_employers(get_all_urls(session), config, now)
+
+        if resume:
+            progress = load_progress(session)
+        else:
+            progress = {}
+            reset_progress(session)
+            session.commit()
+
+    if not urls and not resolve:
+        return
+
+    # Employers in progress, merged from their tasks until all of their pages are done
+    employers = {}
+    finished = []
+
+    def split(task: PageTask, pages: int) -> Tuple[PageTask, PageTask]:
+        # The pages beyond the page budget stay queued for --resume, the employer waits for both parts
+        employers[task.employer_id]["remaining"] += 1
+        return split_task(task, pages)
+
+    scheduler = Scheduler(config, split=split)
+    priorities = {url.employer_id: priority(url, config, now) for url in urls}
+
+    # The trace of the run, worker processes join it and nest their page spans in the employer spans
+    run_span = start_run(engine=engine_name, resume=resume)
+    employer_spans = {}
+
+    # Pages, reviews and errors per second across the workers, and the pages left
+    reporter = Progress(max_pages=config.max_pages, page_limit=MAX_PAGES)
+
+    for url in urls:
+        employer_progress = progress.get(url.employer_id)
+        if employer_progress is None or employer_progress["overview"] is None:
+            # Page 1 is sized by the employer's expected cost since it unlocks the employer's other pages
+            scheduler.push(PageTask(url.employer_id, url.url_new, 1, 1), expected_cost(url), priorities[url.employer_id], fetches=1)
+            reporter.add_employer(url.employer_id, expected_cost(url))
+            continue
+
+        # Page 1 is done, only queue the pages that are not
+        pages = sorted(page for page, status in employer_progress["pages"].items() if status != "done")
+        tasks = split_pages(url.employer_id, url.url_new, pages)
+        employers[url.employer_id] = {"overview": employer_progress["overview"], "remaining": len(tasks), "reviews": 0}
+        reporter.add_employer(url.employer_id, len(pages))
+        for page_task in tasks:
+            scheduler.push(page_task, page_task.last_page - page_task.first_page + 1, priorities[url.employer_id])
+        if not tasks:
+            finished.append(url.employer_id)
+            reporter.finish_employer(url.employer_id)
+
+    results = Queue()
+    in_flight = 0
+    deadline = None
+    expired = False
+
+    # Reviews stored before the run, shared with the workers, which skip them on refreshed pages. Workers of
+    # the distributed engine run on other nodes and load their own.
+    if engine_name != "distributed":
+        with get_db() as session:
+            share_known_reviews(session)
+
+    try:
+        # Create a pool of worker processes, one process with many concurrent fetches, or a job queue
+        if engine_name == "async":
+            scraper = AsyncEngine()
+        elif engine_name == "distributed":
+            scraper = BrokerEngine(DatabaseBroker())
+        else:
+            scraper = PoolEngine(cpu_count() if resolve else min(cpu_count(), len(urls)))
+
+        with scraper, get_db() as session, shutdown_signals() as shutdown:
+            ########## Debug print statement ##########
+            print(f"Starting work with {engine_name} engine, {scraper.capacity} tasks at once")
+
+            # Resolve companies in a thread, whose employers join the run as their batches are committed
+            resolved = Queue()
+            resolving = resolve
+            stop_resolving = Event()
+            resolver = Thread(target=resolve_companies, args=(resolved, stop_resolving), daemon=True)
+            if resolve:
+                resolver.start()
+
+            reporter.start()
+
+            pending_companies = [{**employers.pop(employer_id)["overview"], "last_scraped_at": now} for employer_id in finished]
+            while (scheduler and not scheduler.exhausted and not shutdown.is_set()) or in_flight or resolving:
+                # Once no new employer can be scraped, the resolver writes what it resolved and the run stops
+                # waiting for it
+                full = config.max_employers is not None and len(priorities) >= config.max_employers
+                if resolving and (shutdown.is_set() or scheduler.exhausted or full):
+                    stop_resolving.set()
+                    resolving = False
+
+                # Queue page 1 of the newly resolved employers that the run has room for
+                while resolving:
+                    try:
+                        employer_ids = resolved.get_nowait()
+                    except Empty:
+                        break
+                    if employer_ids is None:
+                        resolving = False
+                        break
+                    new_urls = get_all_urls(session, [employer_id for employer_id in employer_ids if employer_id not in priorities])
+                    if config.max_employers is not None:
+                        new_urls = new_urls[:max(config.max_employers - len(priorities), 0)]
+                    for url in new_urls:
+                        priorities[url.employer_id] = priority(url, config, now)
+                        scheduler.push(PageTask(url.employer_id, url.url_new, 1, 1), expected_cost(url), priorities[url.employer_id], fetches=1)
+                        reporter.add_employer(url.employer_id, expected_cost(url))
+
+                # On shutdown, start no new page and give the pages in progress until the deadline
+                if shutdown.is_set() and deadline is None:
+                    deadline = monotonic() + SHUTDOWN_SECONDS
+                    scraper.stop()
+
+                # Once the time budget is spent, the tasks in progress stop after their current page
+                if scheduler.expired and not expired:
+                    expired = True
+                    scraper.stop()
+
+                # Keep every worker busy with the next task, until the run's budget is spent
+                while deadline is None and in_flight < scraper.capacity and (task := scheduler.pop()) is not None:
+                    scraper.submit(
+                        task,
+                        callback=results.put,
+                        error_callback=lambda e, task=task: results.put({"task": task, "overview": None, "reviews": 0, "error": e}),
                     )
-                    continue  # Skip to the next review if the data is invalid
-
-                try:
-                    # Create a new Review object with the validated data
-                    observation = Review(**valid_review.model_dump())
-
-                    # Associate the review with the company
-                    observation.company = company
-
-                    # Add the new review to the session
-                    session.add(observation)
-
-                    # Increment the counter
-                    counter += 1
+                    in_flight += 1
+                    if task.employer_id not in employer_spans:
+                        employer_spans[task.employer_id] = start_employer(task.employer_id, url=task.url_new)
 
-                    # If the counter reaches 100, commit the session and reset the counter
-                    if counter >= 100:
-                        session.commit()
+                if not in_flight and not resolving:
+                    break  # The budget ran out while no task was running
 
-                        ########## Debug print statement ##########
-                        print(f"Committed 100 reviews for {url}")
-
-                        counter = 0
-                except (IntegrityError, Exception) as e:
-                    session.rollback()
-                    logger.error(
-                        f"Error updating review data: {e}",
-                        extra={"url": url, "review": review}, 
-                    )
-
-            # Commit any remaining reviews that didn't reach the counter limit
-            if counter > 0:
-                session.commit()
+                try:
+                    result = results.get(timeout=1)  # Wake up regularly to notice a shutdown
+                except Empty:
+                    if deadline is not None and monotonic() >= deadline:
+                        print(f"Shutdown deadline passed, abandoning {in_flight} tasks in progress")
+                        break
+                    continue
+
+                in_flight -= 1
+                task = result["task"]
+                if "error" in result:
+                    logger.error(f"Error in worker: {result['error']}", extra={"url": task.url_new})
+
+                if task.first_page == 1:
+                    overview = result["overview"]
+                    if overview is None:
+                        employer_spans.pop(task.employer_id).end(error="Page 1 failed")
+                        reporter.finish_employer(task.employer_id, failed=True)
+                        continue  # Skip the employer if page 1 failed
+
+                    # Page 1 revealed the number of pages, spread the other pages across the workers
+                    last_page = min(overview.get("number_of_pages") or 1, MAX_PAGES)
+                    tasks = split_pages(task.employer_id, task.url_new, list(range(2, last_page + 1)))
+                    reporter.set_pages(task.employer_id, last_page)
+                    employers[task.employer_id] = {"overview": overview, "remaining": len(tasks), "reviews": result["reviews"]}
+                    for page_task in tasks:
+                        scheduler.push(page_task, page_task.last_page - page_task.first_page + 1, priorities[task.employer_id])
+                else:
+                    employers[task.employer_id]["remaining"] -= 1
+                    employers[task.employer_id]["reviews"] += result["reviews"]
+
+                # A task cut short by the shutdown leaves pages for --resume, the employer is not finalized
+                if result.get("stopped"):
+                    employers[task.employer_id]["stopped"] = True
+
+                # Finalize the company row once all pages of the employer are done
+                if employers[task.employer_id]["remaining"] == 0 and not employers[task.employer_id].get("stopped"):
+                    employer = employers.pop(task.employer_id)
+                    print(f"Finished {task.url_new}: {employer['reviews']} reviews")
+                    if task.employer_id in employer_spans:
+                        employer_spans.pop(task.employer_id).end()
+                    reporter.finish_employer(task.employer_id)
+
+                    pending_companies.append({**employer["overview"], "last_scraped_at": datetime.now()})
+                    if len(pending_companies) >= COMPANY_BATCH_SIZE:
+                        flush_companies(session, pending_companies)
+
+            # Write the companies that didn't fill a whole batch
+            flush_companies(session, pending_companies)
+            reporter.stop()
+
+            # The searches in flight end and the companies resolved so far are written
+            stop_resolving.set()
+            if resolver.is_alive():
+                resolver.join(SHUTDOWN_SECONDS)
+
+            # Employers left for --resume end with the run
+            for employer_span in employer_spans.values():
+                employer_span.attributes["unfinished"] = True
+                employer_span.end()
+            run_span.end()
+            flush_spans(force=True)
 
-                ########## Debug print statement ##########
-                print(f"Committed remaining reviews for {url}")
-            
             ########## Debug print statement ##########
-            print(f"Finished processing {len(urls)} URLs")
-
-
-def main() -> None:
-    # Set up a QueueListener for the logger in the main process
-    queue = get_queue()
-    listener = QueueListener(queue, *logger.handlers)
-    listener.start()
+            if employers or scheduler:
+                reason = "Shut down" if shutdown.is_set() else "Budget spent"
+                print(f"{reason}, {len(employers)} employers in progress and {len(scheduler)} tasks left for --resume")
+            print("Finished processing all URLs")
+    finally:
+        # The workers are done, or the run failed
+        close_known_reviews()
 
-    Review.__table__.create(bind=engine, checkfirst=True) 
-
-    with get_db() as session:
-        urls = get_all_urls(session)
-
-     # Divide the URLs among the workers
-    num_workers = cpu_count()
-    if num_workers > len(urls):
-        num_workers = len(urls)
-    urls_per_worker, remainder = divmod(len(urls), num_workers)
-    urls_for_workers = [urls[i:i + urls_per_worker + (1 if i < remainder else 0)] for i in range(0, len(urls), urls_per_worker)]
-
-    # Create a pool of worker processes
-    with Pool(num_workers) as pool:
-        ########## Debug print statement ##########
-        print(f"Starting work with {num_workers} workers")
-
-        # Use the pool to run the scrape_and_store function for each URL in parallel
-        pool.map(scrape_and_store, urls_for_workers)
 
-        ########## Debug print statement ##########
-        print("Finished processing all URLs")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape overview and reviews of all companies.")
+    parser.add_argument("--resume", action="store_true", help="skip the pages an interrupted run already stored")
+    parser.add_argument("--max-employers", type=int, help="scrape at most this many employers, most valuable first")
+    parser.add_argument("--max-pages", type=int, help="fetch at most this many review pages")
+    parser.add_argument("--max-minutes", type=float, help="start no new page after this many minutes")
+    parser.add_argument("--engine", choices=["pool", "async", "distributed"], help="worker processes, concurrent fetches in one process, or jobs for worker.py")
+    parser.add_argument("--resolve", action="store_true", help="resolve company names like companies.py and scrape each employer once resolved")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this local port, defaults to METRICS_PORT")
+    parser.add_argument("--profile", nargs="?", const=os.path.join(os.getenv("LOG_PATH", "."), "profiles"), help="profile every worker process and merge their profiles, in profiles in LOG_PATH by default")
+    parser.add_argument("--profile-seconds", type=float, help="profile each worker for this many seconds from its start, defaults to the whole run")
+    parser.add_argument("--profile-memory", action="store_true", help="with --profile, also trace the memory each employer leaves allocated")
+    parser.add_argument("--trace", nargs="?", const=os.path.join(os.getenv("LOG_PATH", "."), "traces.jsonl"), help="write OTLP/JSON spans to this file, defaults to traces.jsonl in LOG_PATH")
+    args = parser.parse_args()
+
+    # Start the workers from a forkserver, before any queue or event is created
+    configure_workers()
+
+    # Command line budgets override the environment
+    config = ScheduleConfig.from_env()
+    if args.max_employers is not None:
+        config.max_employers = args.max_employers
+    if args.max_pages is not None:
+        config.max_pages = args.max_pages
+    if args.max_minutes is not None:
+        config.max_seconds = args.max_minutes * 60
 
-    # Stop the QueueListener
-    listener.stop()
+    # Setup logging
+    listener = setup_logging()
 
+    # Trace the run with TRACE_PATH, TRACE_ENDPOINT or --trace
+    if args.trace:
+        configure_tracing(path=args.trace)
 
-if __name__ == "__main__":
+    # Profile the worker processes, which must be started afterwards
+    profile_path = None
+    if args.profile:
+        profile_path = configure_profiling(args.profile, args.profile_seconds, args.profile_memory)
 
-    # Setup logging
-    listener, lt = setup_logging()
+    # Collect the metrics of the worker processes, which must be started after the collector
+    collector = Collector(port=args.metrics_port).start()
 
-    # Start time
-    start_time = process_time()
+    # Start time, wall time of the run and CPU time of the main process
+    start_time, start_cpu = perf_counter(), process_time()
 
-    # Run the main function
-    main()
+    try:
+        # Run the main function
+        main(resume=args.resume, config=config, engine_name=args.engine, resolve=args.resolve)
 
-    # End time
-    end_time = process_time()
+        # End time
+        end_time, end_cpu = perf_counter(), process_time()
 
-    # Log the time taken
-    logger.info(
-        f"Scraping complete, time taken: {end_time - start_time} seconds",
-        extra={"time": end_time - start_time},
-    )
-    print(f"\n\nTime taken: {end_time - start_time} seconds\n\n")
+        # Log the time taken
+        logger.info(
+            f"Scraping complete, time taken: {end_time - start_time} seconds",
+            extra={"time": end_time - start_time, "main_cpu_time": end_cpu - start_cpu},
+        )
+        print(f"\n\nTime taken: {end_time - start_time} seconds\n\n")
 
-    # Stop listener
-    log_queue = listener.queue
-    log_queue.put(None)
-    lt.join()
-    listener.stop()
+        # The workers dumped their profiles when the engine shut down
+        if profile_path is not None:
+            print(f"Profile report: {profile_report(profile_path)}")
 
+    finally:
+        # Write the last metrics snapshot, then stop the listener, also after a second Ctrl-C, so that no
+        # queued log record is lost
+        collector.stop()
+        listener.stop()
@@ -0,0 +1,362 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Queue, current_process, util
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from time import monotonic, perf_counter
+from datetime import datetime
+from bisect import bisect_left
+from queue import Empty
+import json
+import os
+
+from log import logger
+
+# Upper bounds in seconds of the latency histogram buckets, from parsing a page to fetching it through the proxy
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 180.0)
+
+# Seconds between the deltas a worker process sends to the main process
+FLUSH_SECONDS = 1.0
+
+Labels = Tuple[Tuple[str, str], ...]
+Series = Tuple[str, Labels]
+
+
+class Registry:
+    """
+    Counters and latency histograms of one process, keyed by metric name and labels.
+
+    A histogram is stored as its count per bucket, with one more bucket for values above the last bound,
+    followed by the sum of its values.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[Series, float] = {}
+        self.histograms: Dict[Series, List[float]] = {}
+        self._lock = Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0.0] * (len(BUCKETS) + 2)
+            histogram[bisect_left(BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def drain(self) -> Tuple[Dict[Series, float], Dict[Series, List[float]]]:
+        """
+        Takes the values recorded since the last call, to be merged into the registry of the main process.
+        """
+        with self._lock:
+            delta = self.counters, self.histograms
+            self.counters, self.histograms = {}, {}
+        return delta
+
+    def merge(self, delta: Tuple[Dict[Series, float], Dict[Series, List[float]]]) -> None:
+        counters, histograms = delta
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0.0) + value
+            for key, values in histograms.items():
+                histogram = self.histograms.setdefault(key, [0.0] * (len(BUCKETS) + 2))
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+    def prometheus(self) -> str:
+        """
+        Renders the registry in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters, histograms = dict(self.counters), {key: list(values) for key, values in self.histograms.items()}
+
+        lines, typed = [], set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_render(labels)} {value:g}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0.0
+            for bound, count in zip((*BUCKETS, "+Inf"), values[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_render(labels + (('le', str(bound)),))} {cumulative:g}")
+            lines.append(f"{name}_sum{_render(labels)} {values[-1]:g}")
+            lines.append(f"{name}_count{_render(labels)} {cumulative:g}")
+        return "\n".join(lines) + "\n"
+
+    def totals(self) -> Dict[str, float]:
+        """
+        Returns the value of each counter summed over its labels, e.g. the pages of all workers.
+        """
+        with self._lock:
+            totals: Dict[str, float] = {}
+            for (name, _), value in self.counters.items():
+                totals[name] = totals.get(name, 0.0) + value
+            return totals
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns the registry as a JSON-serializable dictionary, with the total count and seconds of each histogram.
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "count": sum(values[:-1]), "sum": values[-1], "buckets": values[:-1]}
+                    for (name, labels), values in self.histograms.items()
+                ],
+            }
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _render(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+# The metrics of this process, or of all processes in the process that runs the collector
+_registry = Registry()
+
+# Set by the collector and inherited by the worker processes it forks, which send their deltas on it
+_queue: Optional[Queue] = None
+_collector_pid: Optional[int] = None
+_last_flush = monotonic()
+
+# The worker label of this process and the labels of the current task, e.g. its employer
+_worker: Optional[str] = None
+_context: ContextVar[Dict[str, Any]] = ContextVar("metrics_labels", default={})
+
+
+def set_worker(name: str) -> None:
+    """
+    Names the worker whose metrics this process records, defaults to the process name.
+    """
+    global _worker
+    _worker = name
+
+
+def set_labels(**labels: Any) -> None:
+    """
+    Tags the stages timed from now on in this thread or asyncio task, e.g. `set_labels(employer=...)`.
+    """
+    _context.set(labels)
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    """
+    Adds to a counter of this worker.
+    """
+    _registry.inc(name, value, worker=_worker or current_process().name, **labels)
+    flush()
+
+
+def observe(stage: str, seconds: float, **labels: Any) -> None:
+    """
+    Records the duration of one run of a stage.
+
+    The latency histogram is tagged by stage and worker. The time per employer is counted in
+    `scrape_employer_stage_seconds_total` and `scrape_employer_stage_calls_total` instead, since one
+    histogram per employer would multiply the number of series by the number of buckets.
+
+    Args:
+        stage (str): The stage, e.g. "fetch" or "db_write".
+        seconds (float): The duration.
+        **labels (Any): Labels of the run, added to those set by `set_labels()`.
+    """
+    labels = {**_context.get(), **labels}
+    _registry.observe("scrape_stage_seconds", seconds, stage=stage, worker=_worker or current_process().name)
+    employer = labels.get("employer")
+    if employer is not None:
+        _registry.inc("scrape_employer_stage_seconds_total", seconds, stage=stage, employer=employer)
+        _registry.inc("scrape_employer_stage_calls_total", 1, stage=stage, employer=employer)
+    flush()
+
+
+def totals() -> Dict[str, float]:
+    """
+    The counters of this process summed over their labels, of all processes in the collector's process.
+    """
+    return _registry.totals()
+
+
+@contextmanager
+def timer(stage: str, **labels: Any) -> Iterator[None]:
+    """
+    Times the block as one run of a stage, see `observe()`. Errors raised by the block are counted in
+    `scrape_stage_errors_total`.
+    """
+    start = perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("scrape_stage_errors_total", stage=stage)
+        raise
+    finally:
+        observe(stage, perf_counter() - start, **labels)
+
+
+def flush(force: bool = False) -> None:
+    """
+    Sends the metrics recorded in this worker process to the collector, at most once per FLUSH_SECONDS unless
+    forced. Does nothing in the collector's process and when no collector runs.
+    """
+    global _last_flush
+    if _queue is None or os.getpid() == _collector_pid:
+        return
+    if not force and monotonic() - _last_flush < FLUSH_SECONDS:
+        return
+
+    _last_flush = monotonic()
+    counters, histograms = _registry.drain()
+    if counters or histograms:
+        _queue.put((counters, histograms))
+
+
+def settings() -> Dict[str, Any]:
+    """
+    The queue of the collector, passed to worker processes that are not forked from the collector's process.
+    """
+    return {"queue": _queue}
+
+
+def apply_settings(settings: Dict[str, Any]) -> None:
+    """
+    Sends the metrics of this worker process to the collector, see `settings()`.
+    """
+    global _queue
+    _queue = settings["queue"]
+
+
+def _after_fork() -> None:
+    """
+    Forgets the metrics inherited from the parent process, which counts them itself, and sends the rest of
+    this process's metrics when it exits.
+    """
+    global _registry
+    _registry = Registry()
+    util.Finalize(None, flush, kwargs={"force": True}, exitpriority=10)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics of all processes at `/metrics`.
+    """
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = _registry.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # Scrapes of the endpoint are not worth a log record
+
+
+class Collector:
+    """
+    Collects the metrics of this process and of the worker processes it starts afterwards.
+
+    Worker processes send their metrics every second. The totals are served in the Prometheus text format on
+    `http://127.0.0.1:<port>/metrics` if a port is given, and appended to a JSONL file every `interval` seconds.
+
+    Attributes:
+        port (Optional[int]): The port of the endpoint, set by `METRICS_PORT`. None serves no endpoint.
+        path (str): The JSONL file, set by `METRICS_PATH`, else `metrics.jsonl` in `LOG_PATH`.
+        interval (float): The seconds between snapshots, set by `METRICS_INTERVAL`.
+    """
+
+    def __init__(self, port: Optional[int] = None, path: Optional[str] = None, interval: Optional[float] = None) -> None:
+        port = port if port is not None else os.getenv("METRICS_PORT")
+        self.port = int(port) if port else None
+        self.path = path or os.getenv("METRICS_PATH") or os.path.join(os.getenv("LOG_PATH", "."), "metrics.jsonl")
+        self.interval = interval or float(os.getenv("METRICS_INTERVAL", 30))
+        self.start_time = monotonic()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop = Event()
+        self._threads: List[Thread] = []
+
+    def start(self) -> "Collector":
+        """
+        Starts collecting, before the worker processes are started so that they inherit the queue.
+        """
+        global _queue, _collector_pid
+        _queue, _collector_pid = Queue(), os.getpid()
+
+        self._threads = [Thread(target=self._collect, daemon=True), Thread(target=self._snapshots, daemon=True)]
+        if self.port is not None:
+            try:
+                self._server = ThreadingHTTPServer(("127.0.0.1", self.port), MetricsHandler)
+                self._threads.append(Thread(target=self._server.serve_forever, daemon=True))
+            except OSError as e:
+                logger.error(f"Metrics endpoint not started: {e}", extra={"port": self.port})
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Merges the metrics still queued and writes a last snapshot.
+        """
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+        for thread in self._threads:
+            thread.join()
+        self._drain()
+        self.write_snapshot()
+
+    def write_snapshot(self) -> None:
+        snapshot = {"timestamp": datetime.now().isoformat(), "uptime_seconds": monotonic() - self.start_time}
+        snapshot.update(_registry.snapshot())
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+        except OSError as e:
+            logger.error(f"Error writing metrics snapshot: {e}", extra={"path": self.path})
+
+    def _collect(self) -> None:
+        while not self._stop.is_set():
+            try:
+                _registry.merge(_queue.get(timeout=1))
+            except Empty:
+                pass
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                _registry.merge(_queue.get_nowait())
+            except Empty:
+                return
+
+    def _snapshots(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write_snapshot()
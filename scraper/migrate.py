@@ -0,0 +1,28 @@
+from dotenv import load_dotenv
+
+import os
+import sys
+
+# Append the path to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()  # Load .env file
+
+from database import Company, engine
+from database.migrations import add_missing_columns, drop_stored_review_text, reclaim_space
+
+
+if __name__ == "__main__":
+
+    # Add company columns introduced since the database was created
+    for column in add_missing_columns(engine, Company.__table__):
+        print(f"Added company column {column}")
+
+    # Review text is computed on read, drop the stored copy
+    if drop_stored_review_text(engine):
+        print("Dropped stored review_text column")
+
+        # Shrink the database file
+        reclaim_space(engine)
+        print("Reclaimed free space")
+    else:
+        print("Nothing to migrate")
@@ -0,0 +1,270 @@
+from multiprocessing import current_process, util
+from typing import Any, Dict, List, Optional
+from time import monotonic
+from datetime import datetime
+import argparse
+import cProfile
+import pstats
+import threading
+import tracemalloc
+import glob
+import json
+import io
+import os
+
+from log import logger
+
+# Seconds between the dumps of a worker's profile, so that a terminated worker loses little of it
+DUMP_SECONDS = 10.0
+
+# Frames kept per allocation by tracemalloc, more find the caller that grows but slow every allocation
+MEMORY_FRAMES = 10
+
+# Where the profiles of the run's processes are dumped, profiling is off unless set
+_path: Optional[str] = os.getenv("PROFILE_PATH")
+
+# Seconds each process is profiled from its start, 0 profiles it until it exits
+_seconds = float(os.getenv("PROFILE_SECONDS", 0))
+
+# Whether the memory allocated by each employer is traced too
+_memory = os.getenv("PROFILE_MEMORY") == "1"
+
+# Allocations of the profilers themselves, left out of the memory growth
+IGNORED_FILES = ("cProfile.py", "pstats.py", "tracemalloc.py", "profiling.py")
+
+_profile: Optional[cProfile.Profile] = None
+_thread: Optional[int] = None
+_name: Optional[str] = None
+_started = 0.0
+_last_dump = 0.0
+_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def configure(path: str, seconds: Optional[float] = None, memory: bool = False) -> str:
+    """
+    Turns profiling on for the worker processes started afterwards, in a new directory for this run.
+
+    Args:
+        path (str): The directory of the profiles of all runs.
+        seconds (Optional[float]): How long each process is profiled from its start. Defaults to None,
+            until it exits.
+        memory (bool): Also take a tracemalloc snapshot after each employer's task.
+
+    Returns:
+        str: The directory of this run's profiles.
+    """
+    global _path, _seconds, _memory
+    _path = os.path.join(path, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    _seconds = seconds or 0.0
+    _memory = memory
+    os.makedirs(_path, exist_ok=True)
+
+    # Read again by worker processes that are not forked
+    os.environ.update(PROFILE_PATH=_path, PROFILE_SECONDS=str(_seconds), PROFILE_MEMORY="1" if memory else "0")
+    return _path
+
+
+def settings() -> Dict[str, Any]:
+    """
+    The run's profile directory and options, passed to worker processes that are not forked from this one.
+    """
+    return {"path": _path, "seconds": _seconds, "memory": _memory}
+
+
+def apply_settings(settings: Dict[str, Any]) -> None:
+    """
+    Profiles this worker process like the others of the run, see `settings()`.
+    """
+    global _path, _seconds, _memory
+    _path, _seconds, _memory = settings["path"], settings["seconds"], settings["memory"]
+
+
+def start(name: Optional[str] = None) -> None:
+    """
+    Profiles the calling thread of this process, once, if profiling is on.
+
+    Args:
+        name (Optional[str]): Names the process's files. Defaults to the process name.
+    """
+    global _profile, _thread, _name, _started, _last_dump
+    if not _path or _thread is not None:
+        return
+
+    _name = f"{name or current_process().name}-{os.getpid()}"
+    _thread = threading.get_ident()
+    if _memory:
+        tracemalloc.start(MEMORY_FRAMES)
+    _profile = cProfile.Profile()
+    _started = _last_dump = monotonic()
+    _profile.enable()
+
+    # Pool workers are terminated without exit handlers, they rely on the dumps of `checkpoint()` instead
+    util.Finalize(None, stop, exitpriority=10)
+
+
+def checkpoint(force: bool = False) -> None:
+    """
+    Ends the profile of this process once its window is over, else dumps it every DUMP_SECONDS unless
+    forced. Called after each unit of work, by the profiled thread only.
+    """
+    if _profile is None or threading.get_ident() != _thread:
+        return
+    if _seconds and monotonic() - _started >= _seconds:
+        stop()
+    elif force or monotonic() - _last_dump >= DUMP_SECONDS:
+        dump()
+
+
+def dump() -> None:
+    """
+    Writes the profile of this process so far, replacing its previous dump.
+    """
+    global _last_dump
+    if _profile is None:
+        return
+    file = os.path.join(_path, f"{_name}.prof")
+    try:
+        # Takes a snapshot of the stats, which ends the profile
+        _profile.dump_stats(f"{file}.tmp")
+        os.replace(f"{file}.tmp", file)
+    except OSError as e:
+        logger.error(f"Error writing profile: {e}", extra={"path": file})
+    _last_dump = monotonic()
+    if threading.get_ident() == _thread:
+        _profile.enable()
+
+
+def stop() -> None:
+    """
+    Ends the profile of this process and writes it.
+    """
+    global _profile
+    if _profile is None:
+        return
+    dump()
+    _profile.disable()
+    _profile = None
+
+
+def snapshot_memory(employer_id: int) -> None:
+    """
+    Records the memory this process allocated and kept since the previous employer, by line of code.
+
+    Args:
+        employer_id (int): The employer whose task just ended, its growth is appended to `memory-*.jsonl`.
+    """
+    global _snapshot
+    if not tracemalloc.is_tracing() or _path is None:
+        return
+
+    # The snapshot is slow, it is left out of the profile
+    profiling = _profile is not None and threading.get_ident() == _thread
+    if profiling:
+        _profile.disable()
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    growth = snapshot.compare_to(_snapshot, "lineno") if _snapshot is not None else snapshot.statistics("lineno")
+    growth = [stat for stat in growth if not stat.traceback[0].filename.endswith(IGNORED_FILES)]
+    _snapshot = snapshot
+    record = {
+        "timestamp": datetime.now().isoformat(),
+        "worker": _name,
+        "employer_id": employer_id,
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top": [
+            {
+                "where": str(stat.traceback[0]),
+                "size_diff": getattr(stat, "size_diff", stat.size),
+                "count_diff": getattr(stat, "count_diff", stat.count),
+            }
+            for stat in growth[:10]
+        ],
+    }
+    try:
+        with open(os.path.join(_path, f"memory-{_name}.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logger.error(f"Error writing memory snapshot: {e}", extra={"path": _path})
+    if profiling:
+        _profile.enable()
+
+
+def _after_fork() -> None:
+    """
+    Forgets the profile of the parent process, a forked worker starts its own in `start()`.
+    """
+    global _profile, _thread, _snapshot
+    if _profile is not None:
+        _profile.disable()
+    _profile, _thread, _snapshot = None, None, None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def merge(path: str) -> Optional[pstats.Stats]:
+    """
+    Merges the profiles of all processes of a run, None if there are none.
+    """
+    files = sorted(glob.glob(os.path.join(path, "*.prof")))
+    if not files:
+        return None
+    stats = pstats.Stats(files[0], stream=io.StringIO())
+    for file in files[1:]:
+        stats.add(file)
+    return stats
+
+
+def report(path: str, top: int = 40) -> str:
+    """
+    Writes `report.txt` in a run's profile directory: the hottest functions of all processes by own time
+    and by cumulative time, and the lines whose memory grew most over any one employer.
+
+    Args:
+        path (str): The directory of the run's profiles.
+        top (int): The number of functions and lines listed.
+
+    Returns:
+        str: The path of the report.
+    """
+    stream = io.StringIO()
+    stats = merge(path)
+    if stats is None:
+        stream.write("No profiles\n")
+    else:
+        stats.stream = stream
+        stream.write(f"Profiles of {len(glob.glob(os.path.join(path, '*.prof')))} processes\n\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    growth: List[Dict[str, Any]] = []
+    for file in glob.glob(os.path.join(path, "memory-*.jsonl")):
+        with open(file) as f:
+            for line in f:
+                record = json.loads(line)
+                growth.extend({**stat, "employer_id": record["employer_id"], "worker": record["worker"]} for stat in record["top"])
+    if growth:
+        stream.write("Largest memory growth over one employer\n\n")
+        for stat in sorted(growth, key=lambda stat: stat["size_diff"], reverse=True)[:top]:
+            stream.write(f"{stat['size_diff'] / 1024:>12,.1f} KiB {stat['count_diff']:>+8} blocks  {stat['where']}  (employer {stat['employer_id']}, {stat['worker']})\n")
+
+    file = os.path.join(path, "report.txt")
+    with open(file, "w") as f:
+        f.write(stream.getvalue())
+    return file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the profiles of a `main.py --profile` run into one report.")
+    parser.add_argument("path", help="the run's profile directory")
+    parser.add_argument("--top", type=int, default=40, help="functions and lines listed")
+    args = parser.parse_args()
+
+    with open(report(args.path, args.top)) as f:
+        print(f.read())
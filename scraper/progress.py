@@ -0,0 +1,208 @@
+from collections import deque
+from threading import Event, Lock, Thread
+from typing import Any, Deque, Dict, Optional, Tuple
+from time import monotonic
+from datetime import datetime, timedelta
+import json
+import sys
+import os
+
+from log import logger
+from metrics import totals
+
+# Seconds over which the rates are measured, long enough to smooth out the pause after each page
+WINDOW_SECONDS = 60.0
+
+# Counters sent by the workers, see `metrics.inc()`
+COUNTERS = {
+    "pages": "scrape_pages_total",
+    "errors": "scrape_page_errors_total",
+    "reviews": "scrape_reviews_total",
+    "bytes": "scrape_response_bytes_total",
+}
+
+
+class Progress:
+    """
+    Reports the progress and throughput of a run while it is going.
+
+    Pages, reviews, response bytes and failed pages are counted by the workers and reach the main process
+    with their metrics, so the collector must be started before the workers. The employers and their
+    number of pages are reported by the main loop: an employer is estimated at its number of pages from the
+    last run until its page 1 reveals the actual number. The ETA divides the pages left, within the run's
+    page budget, by the pages per second of the last WINDOW_SECONDS.
+
+    Every `interval` seconds a line is printed to stderr and a snapshot is appended to a JSONL file.
+
+    Attributes:
+        path (str): The JSONL file, set by `PROGRESS_PATH`, else `progress.jsonl` in `LOG_PATH`.
+        interval (float): The seconds between reports, set by `PROGRESS_INTERVAL`. 0 prints no line.
+        max_pages (Optional[int]): The page budget of the run.
+        page_limit (Optional[int]): The maximum number of pages scraped per employer.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        interval: Optional[float] = None,
+        max_pages: Optional[int] = None,
+        page_limit: Optional[int] = None,
+    ) -> None:
+        self.path = path or os.getenv("PROGRESS_PATH") or os.path.join(os.getenv("LOG_PATH", "."), "progress.jsonl")
+        self.interval = interval if interval is not None else float(os.getenv("PROGRESS_INTERVAL", 10))
+        self.max_pages = max_pages
+        self.page_limit = page_limit
+        self.start_time = monotonic()
+        self._pages: Dict[int, int] = {}
+        self._pages_total = 0
+        self._unknown = set()
+        self._done = 0
+        self._failed = 0
+        self._samples: Deque[Tuple[float, Dict[str, float]]] = deque()
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def add_employer(self, employer_id: int, pages: Optional[float]) -> None:
+        """
+        Counts an employer queued by the run.
+
+        Args:
+            employer_id (int): The ID of the employer.
+            pages (Optional[float]): The pages expected to be fetched, None or infinite if unknown, which
+                counts as one page until page 1 is done.
+        """
+        known = pages is not None and pages != float("inf")
+        if known and self.page_limit is not None:
+            pages = min(pages, self.page_limit)
+        with self._lock:
+            self._set_pages(employer_id, max(int(pages), 1) if known else 1)
+            if not known:
+                self._unknown.add(employer_id)
+
+    def set_pages(self, employer_id: int, pages: int) -> None:
+        """
+        Replaces the estimate of an employer with its actual number of pages, once page 1 is done.
+        """
+        with self._lock:
+            self._set_pages(employer_id, pages)
+            self._unknown.discard(employer_id)
+
+    def finish_employer(self, employer_id: int, failed: bool = False) -> None:
+        """
+        Counts an employer as done, or as failed if its page 1 failed, which leaves no other page to fetch.
+        """
+        with self._lock:
+            if failed:
+                self._failed += 1
+                self._set_pages(employer_id, 1)
+            else:
+                self._done += 1
+            self._unknown.discard(employer_id)
+
+    def _set_pages(self, employer_id: int, pages: int) -> None:
+        self._pages_total += pages - self._pages.get(employer_id, 0)
+        self._pages[employer_id] = pages
+
+    def start(self) -> "Progress":
+        self.start_time = monotonic()
+        self._samples.append((self.start_time, self._counters()))
+        self._thread = Thread(target=self._report, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops reporting after a last report of the whole run.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.report()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns the progress and the rates of the last WINDOW_SECONDS, with the averages of the whole run.
+        """
+        now = monotonic()
+        counters = self._counters()
+        self._samples.append((now, counters))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= WINDOW_SECONDS:
+            self._samples.popleft()
+        since, before = self._samples[0]
+        elapsed, window = now - self.start_time, max(now - since, 1e-9)
+
+        with self._lock:
+            employers, done, failed, unknown = len(self._pages), self._done, self._failed, len(self._unknown)
+            pages_total = self._pages_total
+
+        fetched = counters["pages"] + counters["errors"]
+        pages_left = max(pages_total - fetched, 0)
+        if self.max_pages is not None:
+            pages_left = min(pages_left, max(self.max_pages - fetched, 0))
+
+        rates = {name: (counters[name] - before[name]) / window for name in COUNTERS}
+        attempts = rates["pages"] + rates["errors"]
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "elapsed_seconds": elapsed,
+            "employers": employers,
+            "employers_done": done,
+            "employers_failed": failed,
+            "employers_remaining": employers - done - failed,
+            "employers_unknown_pages": unknown,
+            "pages_fetched": fetched,
+            "pages_total": pages_total,
+            "pages_left": pages_left,
+            **{name: counters[name] for name in ("reviews", "bytes", "errors")},
+            "pages_per_second": rates["pages"],
+            "reviews_per_second": rates["reviews"],
+            "bytes_per_second": rates["bytes"],
+            "error_rate": rates["errors"] / attempts if attempts else 0.0,
+            "average_pages_per_second": fetched / elapsed if elapsed else 0.0,
+            "eta_seconds": pages_left / attempts if attempts else None,
+        }
+
+    def report(self) -> None:
+        """
+        Prints a progress line and appends a snapshot to the JSONL file.
+        """
+        snapshot = self.snapshot()
+        if self.interval:
+            print(render(snapshot), file=sys.stderr, flush=True)
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+        except OSError as e:
+            logger.error(f"Error writing progress snapshot: {e}", extra={"path": self.path})
+
+    @staticmethod
+    def _counters() -> Dict[str, float]:
+        values = totals()
+        return {name: values.get(counter, 0.0) for name, counter in COUNTERS.items()}
+
+    def _report(self) -> None:
+        while not self._stop.wait(self.interval or WINDOW_SECONDS):
+            self.report()
+
+
+def render(snapshot: Dict[str, Any]) -> str:
+    """
+    Formats a snapshot as one line, e.g.
+    `[0:12:30] 40/120 employers, 2 failed | 5,210/18,400 pages 28.3% | 6.9 pages/s 81 reviews/s 2.1 MB/s 0.4% errors | ETA 0:31:53`
+    """
+    eta = snapshot["eta_seconds"]
+    if eta is None:
+        eta_text = "ETA -"
+    else:
+        # Employers never scraped count one page until their page 1 is done, so the ETA is a lower bound
+        bound = ">" if snapshot["employers_unknown_pages"] else ""
+        eta_text = f"ETA {bound}{timedelta(seconds=round(eta))}"
+    share = snapshot["pages_fetched"] / snapshot["pages_total"] if snapshot["pages_total"] else 0.0
+    return (
+        f"[{timedelta(seconds=round(snapshot['elapsed_seconds']))}] "
+        f"{snapshot['employers_done']}/{snapshot['employers']} employers, {snapshot['employers_failed']} failed | "
+        f"{snapshot['pages_fetched']:,.0f}/{snapshot['pages_total']:,} pages {share:.1%} | "
+        f"{snapshot['pages_per_second']:.1f} pages/s {snapshot['reviews_per_second']:.0f} reviews/s "
+        f"{snapshot['bytes_per_second'] / 1e6:.1f} MB/s {snapshot['error_rate']:.1%} errors | {eta_text}"
+    )
@@ -0,0 +1,131 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import os
+
+from database import Company, normalize_query
+
+# Legal forms that variants of one employer's name differ in. Words such as "group", "holdings" or
+# "international" often name a different employer and are kept.
+LEGAL_FORMS = {
+    "ag", "bv", "co", "company", "corp", "corporation", "gmbh", "inc", "incorporated", "limited", "llc",
+    "llp", "lp", "ltd", "nv", "plc", "sa", "se",
+}
+
+
+def name_key(name: str) -> str:
+    """
+    Reduces a company name to its tokens without the legal forms it ends with, e.g. "NVIDIA Corp" and
+    "Nvidia Corporation" to "nvidia", but "Alphabet Holding Co" to "alphabet holding".
+    """
+    tokens = normalize_query(name).split()
+    while len(tokens) > 1 and tokens[-1] in LEGAL_FORMS:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def trigrams(key: str) -> Set[str]:
+    """
+    The character trigrams of a name key, padded so that short names have trigrams too.
+    """
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LocalResolver:
+    """
+    Resolves company names offline against the companies already resolved on Glassdoor.
+
+    Names are compared by their keys, `name_key()`. The names with the same key and the candidates sharing
+    most trigrams are scored by trigram similarity, and the best one is accepted if it scores at least
+    `threshold` and clearly beats the best candidate of another employer.
+
+    Attributes:
+        threshold (float): The minimum score from 0 to 1, set by `FUZZY_MATCH_THRESHOLD`.
+        margin (float): The minimum lead over another employer's best score.
+        hits (int): The number of names resolved offline.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, margin: float = 0.05, candidates: int = 20) -> None:
+        self.threshold = threshold if threshold is not None else float(os.getenv("FUZZY_MATCH_THRESHOLD", 0.88))
+        self.margin = margin
+        self.candidates = candidates
+        self.hits = 0
+        self._keys: List[str] = []
+        self._employers: List[Tuple[int, str]] = []
+        self._by_key: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._by_trigram: Dict[str, List[int]] = defaultdict(list)
+
+    def load(self, session: Session) -> None:
+        """
+        Indexes the Glassdoor name and the name resolved from of every resolved company.
+        """
+        rows = session.execute(
+            select(Company.employer_id, Company.employer_name, Company.query).where(
+                Company.query.isnot(None), Company.query != "", Company.employer_name.isnot(None)
+            )
+        ).all()
+        for employer_id, employer_name, query in rows:
+            self.add(employer_id, employer_name, employer_name)
+            self.add(employer_id, employer_name, query)
+
+    def add(self, employer_id: int, employer_name: str, name: str) -> None:
+        """
+        Indexes a name that resolves to the given employer.
+        """
+        key = name_key(name)
+        if not key or employer_id in self._by_key[key]:
+            return
+
+        entry = len(self._keys)
+        self._by_key[key][employer_id] = entry
+        self._keys.append(key)
+        self._employers.append((employer_id, employer_name))
+        for trigram in trigrams(key):
+            self._by_trigram[trigram].append(entry)
+
+    def match(self, name: str) -> Optional[Dict[str, str | int]]:
+        """
+        Resolves a name offline if the match is confident.
+
+        Args:
+            name (str): The company name.
+
+        Returns:
+            Optional[Dict[str, str | int]]: The employer ID and name, like `find_company()`, or None if the
+            name has to be searched on Glassdoor.
+        """
+        key = name_key(name)
+        if not key:
+            return None
+
+        # Names with the same key score 1 but still have to beat the names of other employers
+        query_trigrams = trigrams(key)
+        shared = Counter(entry for trigram in query_trigrams for entry in self._by_trigram.get(trigram, ()))
+        candidates = {entry for entry, _ in shared.most_common(self.candidates)}
+        candidates.update(self._by_key.get(key, {}).values())
+
+        best: Dict[int, Tuple[float, int]] = {}
+        for entry in sorted(candidates):
+            score = self._score(key, query_trigrams, entry)
+            employer_id = self._employers[entry][0]
+            if score > best.get(employer_id, (0.0, -1))[0]:
+                best[employer_id] = (score, entry)
+
+        ranked = sorted(best.values(), reverse=True)
+        if not ranked or ranked[0][0] < self.threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][0] - ranked[1][0] < self.margin:
+            return None  # Too close to call between two employers
+        return self._hit(ranked[0][1])
+
+    def _score(self, key: str, query_trigrams: Set[str], entry: int) -> float:
+        entry_trigrams = trigrams(self._keys[entry])
+        return 2 * len(query_trigrams & entry_trigrams) / (len(query_trigrams) + len(entry_trigrams))
+
+    def _hit(self, entry: int) -> Dict[str, str | int]:
+        self.hits += 1
+        employer_id, employer_name = self._employers[entry]
+        return {"employer_id": employer_id, "employer_name": employer_name}
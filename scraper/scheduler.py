@@ -0,0 +1,201 @@
+from sqlalchemy.engine import Row
+from pydantic import BaseModel
+
+from typing import Any, Callable, List, Optional, Set, Tuple
+from datetime import datetime
+from time import monotonic
+import heapq
+import os
+
+
+class ScheduleConfig(BaseModel):
+    """
+    Configures which employers a run refreshes first and how much work it may do.
+
+    Attributes:
+        staleness_weight (float): Priority per day since the employer was last scraped.
+        growth_weight (float): Priority per review on Glassdoor that is not stored yet.
+        watchlist_weight (float): Priority added to employers on the watchlist.
+        never_scraped_days (float): Staleness in days assumed for employers never scraped.
+        watchlist (Set[int]): The employer IDs on the watchlist.
+        max_employers (Optional[int]): The maximum number of employers per run.
+        max_pages (Optional[int]): The maximum number of review pages fetched per run.
+        max_seconds (Optional[float]): The maximum duration of a run, no task is started after it.
+    """
+
+    staleness_weight: float = 1.0
+    growth_weight: float = 0.01
+    watchlist_weight: float = 1000.0
+    never_scraped_days: float = 365.0
+    watchlist: Set[int] = set()
+
+    max_employers: Optional[int] = None
+    max_pages: Optional[int] = None
+    max_seconds: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "ScheduleConfig":
+        """
+        Reads the configuration from `PRIORITY_*` and `SCHEDULE_*` environment variables. The watchlist
+        is read from the file at `WATCHLIST_PATH`, one employer ID per line.
+        """
+        watchlist = set()
+        if os.getenv("WATCHLIST_PATH"):
+            with open(os.getenv("WATCHLIST_PATH")) as f:
+                watchlist = {int(line) for line in f if line.strip()}
+
+        return cls(
+            staleness_weight=os.getenv("PRIORITY_STALENESS_WEIGHT", 1.0),
+            growth_weight=os.getenv("PRIORITY_GROWTH_WEIGHT", 0.01),
+            watchlist_weight=os.getenv("PRIORITY_WATCHLIST_WEIGHT", 1000.0),
+            watchlist=watchlist,
+            max_employers=os.getenv("SCHEDULE_MAX_EMPLOYERS"),
+            max_pages=os.getenv("SCHEDULE_MAX_PAGES"),
+            max_seconds=os.getenv("SCHEDULE_MAX_SECONDS"),
+        )
+
+    @property
+    def has_budget(self) -> bool:
+        return self.max_pages is not None or self.max_seconds is not None
+
+
+def expected_cost(url: Row) -> float:
+    """
+    Estimates how long an employer takes to scrape, in pages.
+
+    Args:
+        url (Row): A row from `get_all_urls()`.
+
+    Returns:
+        float: The number of review pages from the last run, estimated from the review count if
+        unknown, or infinity for employers never scraped so that they are started first.
+    """
+    if url.number_of_pages is not None:
+        return url.number_of_pages
+    if url.all_reviews_count is not None:
+        return url.all_reviews_count / 10  # ~10 reviews per page
+    return float("inf")
+
+
+def priority(url: Row, config: ScheduleConfig, now: datetime) -> float:
+    """
+    Scores how valuable refreshing an employer is, higher first.
+
+    Args:
+        url (Row): A row from `get_all_urls()`.
+        config (ScheduleConfig): The priority weights and watchlist.
+        now (datetime): The start of the run.
+
+    Returns:
+        float: The weighted sum of staleness in days, reviews missing from the database and watchlist membership.
+    """
+    if url.last_scraped_at is not None:
+        staleness = (now - url.last_scraped_at).total_seconds() / 86400
+    else:
+        staleness = config.never_scraped_days
+
+    growth = max((url.all_reviews_count or 0) - (url.stored_reviews or 0), 0)
+    watched = url.employer_id in config.watchlist
+
+    return (
+        config.staleness_weight * staleness
+        + config.growth_weight * growth
+        + config.watchlist_weight * watched
+    )
+
+
+def select_employers(urls: List[Row], config: ScheduleConfig, now: datetime) -> List[Row]:
+    """
+    Orders employers by priority and keeps at most `max_employers`.
+
+    Args:
+        urls (List[Row]): The rows from `get_all_urls()`.
+        config (ScheduleConfig): The priority weights and limits.
+        now (datetime): The start of the run.
+
+    Returns:
+        List[Row]: The employers to scrape this run, highest priority first.
+    """
+    urls = sorted(urls, key=lambda url: priority(url, config, now), reverse=True)
+    return urls[:config.max_employers]
+
+
+class Scheduler:
+    """
+    Hands out the ready tasks of a run until its page or time budget is spent.
+
+    Without a budget every task runs, so the longest task is handed out first and no worker starts a long
+    task when the others are nearly done. With a budget the highest priority task is handed out first,
+    so the budget is spent where fresh data matters most.
+
+    A task that fetches more pages than the page budget has left is split with `split`, the pages beyond
+    the budget stay queued. Without `split` such a task is not handed out, it stays queued and the budget
+    is spent.
+    """
+
+    def __init__(self, config: ScheduleConfig, split: Optional[Callable[[Any, int], Tuple[Any, Any]]] = None) -> None:
+        self.config = config
+        self.split = split
+        self.pages = 0
+        self.full = False  # Whether the next task is larger than the page budget left
+        self.start = monotonic()
+        self._ready = []
+        self._order = 0
+
+    def push(self, task: Any, pages: float, priority: float = 0.0, fetches: Optional[int] = None) -> None:
+        """
+        Adds a ready task.
+
+        Args:
+            task (Any): The task.
+            pages (float): The expected number of pages the task stands for, used to order tasks.
+            priority (float): The priority of the task's employer.
+            fetches (Optional[int]): The number of pages the task fetches, charged to the budget when it is
+                handed out. Defaults to `pages`.
+        """
+        key = (-priority, -pages) if self.config.has_budget else (-pages,)
+        heapq.heappush(self._ready, (key, self._order, fetches if fetches is not None else pages, task))
+        self._order += 1
+
+    def pop(self) -> Any | None:
+        """
+        Takes the next task and charges its pages to the budget.
+
+        Returns:
+            Any | None: The task, or None if no task is ready or the budget is spent.
+        """
+        if not self._ready or self.exhausted:
+            return None
+        key, order, fetches, task = heapq.heappop(self._ready)
+
+        left = self.config.max_pages - self.pages if self.config.max_pages is not None else fetches
+        if fetches > left:
+            if self.split is None:
+                heapq.heappush(self._ready, (key, order, fetches, task))
+                self.full = True
+                return None
+            task, rest = self.split(task, left)
+            heapq.heappush(self._ready, (key, order, fetches - left, rest))
+            fetches = left
+
+        self.pages += fetches
+        return task
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        Whether the run's page or time budget is spent.
+        """
+        if self.config.max_pages is not None and (self.pages >= self.config.max_pages or self.full):
+            return True
+        return self.expired
+
+    @property
+    def expired(self) -> bool:
+        """
+        Whether the run's time budget is spent, the tasks in progress should stop after their current page.
+        """
+        return self.config.max_seconds is not None and monotonic() - self.start >= self.config.max_seconds
+
+    def __len__(self) -> int:
+        return len(self._ready)
@@ -0,0 +1,340 @@
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import signal
+import gc
+import os
+
+from database import get_db, validate_overview, validate_reviews, insert_reviews
+from database import start_page, finish_page, fail_page, register_pages, known_reviews
+from glassdoor import iter_pages, parse_page
+from bootstrap import apply_worker_state
+from log import logger, attach_queue
+from metrics import flush, inc, set_labels, timer
+from tracing import flush as flush_spans, set_employer, span
+from profiling import checkpoint, snapshot_memory, start as start_profiling
+
+# Maximum number of review pages scraped per employer
+MAX_PAGES = 600  ################ Modify for production ################
+
+# Number of review pages per task, large employers are split into many tasks
+PAGE_CHUNK = 20
+
+# Set to 1 to skip the reviews already stored before the run instead of inserting them again
+SKIP_KNOWN_REVIEWS = os.getenv("SKIP_KNOWN_REVIEWS", "0") == "1"
+
+# Seconds the pages in progress get to finish after SIGINT or SIGTERM
+SHUTDOWN_SECONDS = float(os.getenv("SHUTDOWN_SECONDS", 60))
+
+# Set by the main process to shut down, no page is started once it is set
+_stop = None
+
+
+class PageTask(NamedTuple):
+    """
+    A range of review pages of one employer, the unit of work handed to the engine.
+    """
+
+    employer_id: int
+    url_new: str
+    first_page: int
+    last_page: int
+
+
+def init_worker(stop: Optional[Any] = None, state: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Sends the log records of this worker process to the listener in the main process, once per process.
+
+    Ctrl-C reaches every process of the terminal, so workers ignore it and leave the shutdown to the main
+    process, which sets `stop` to let the page in progress finish. With `--profile`, the worker is profiled
+    from here.
+
+    Args:
+        stop (Optional[Any]): A `multiprocessing.Event` set by the main process to shut down.
+        state (Optional[Dict[str, Any]]): The queues and settings of the main process, from
+            `bootstrap.worker_state()`, for workers that are not forked from it.
+    """
+    global _stop
+    _stop = stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if state is not None:
+        apply_worker_state(state)
+    attach_queue()
+    start_profiling()
+
+    # The modules and data inherited from the forkserver are never collected, the garbage collector leaves
+    # them alone instead of writing to every object, which would copy their pages into this process
+    gc.freeze()
+
+
+def stop_requested() -> bool:
+    """
+    Whether the main process asked this worker to shut down.
+    """
+    return _stop is not None and _stop.is_set()
+
+
+def record_failure(session: Session, task: PageTask, page: int, error: str) -> None:
+    """
+    Logs a failed page and records the error in its progress row.
+
+    Args:
+        session (Session): The database session.
+        task (PageTask): The task the page belongs to.
+        page (int): The page number.
+        error (str): The error message.
+    """
+    session.rollback()
+    logger.error(error, extra={"url": task.url_new, "page": page})
+    fail_page(session, task.employer_id, page, error)
+    session.commit()
+
+
+def finish_page_reviews(session: Session, task: PageTask, page: int, overview: Optional[dict]) -> None:
+    """
+    Marks a page as done once its reviews are written, and commits.
+
+    Args:
+        session (Session): The database session.
+        task (PageTask): The task the page belongs to.
+        page (int): The page number.
+        overview (Optional[dict]): The validated overview data of page 1, None for later pages.
+    """
+    finish_page(session, task.employer_id, page, overview)
+    if overview is not None:
+        # Record the employer's other pages as pending, so a resumed run knows what is left
+        last_page = min(overview.get("number_of_pages") or 1, MAX_PAGES)
+        register_pages(session, task.employer_id, range(2, last_page + 1))
+    session.commit()
+
+
+def insert_reviews_one_by_one(
+    session: Session, task: PageTask, page: int, reviews: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Inserts reviews one per transaction after their batch failed, so that only the offending ones are lost.
+
+    Args:
+        session (Session): The database session.
+        task (PageTask): The task the page belongs to.
+        page (int): The page number.
+        reviews (List[Dict[str, Any]]): The validated reviews of the page.
+
+    Returns:
+        List[Dict[str, Any]]: The reviews inserted.
+    """
+    inserted = []
+    for review in reviews:
+        try:
+            insert_reviews(session, [review])
+            session.commit()
+            inserted.append(review)
+        except (IntegrityError, DataError) as e:
+            session.rollback()
+            logger.error(
+                f"Error for database commit: {e.orig}",
+                extra={"url": task.url_new, "page": page, "review": review},
+            )
+    return inserted
+
+
+def store_page(
+    session: Session, task: PageTask, page: int, overview_data: Dict[str, Any], reviews_data: Dict[str, Dict[str, Any]]
+) -> Optional[Tuple[int, Optional[dict]]]:
+    """
+    Validates the scraped data of one page and commits its reviews together with its progress row.
+
+    Args:
+        session (Session): The database session.
+        task (PageTask): The task the page belongs to.
+        page (int): The page number.
+        overview_data (Dict[str, Any]): The overview parsed from the page.
+        reviews_data (Dict[str, Dict[str, Any]]): The reviews parsed from the page.
+
+    Returns:
+        Optional[Tuple[int, Optional[dict]]]: The number of reviews stored and, for page 1, the validated
+        overview data, or None if the page failed.
+    """
+    if not overview_data:
+        record_failure(session, task, page, "No data in apollo object")
+        return None  # Skip the page if there is no data
+
+    # Validate the data with CompanyBase, later pages repeat the overview of page 1
+    overview = None
+    if page == 1:
+        try:
+            with timer("validate", employer=task.employer_id):
+                overview = validate_overview(overview_data)
+
+            ########## Debug print statement ##########
+            print(f"Validated company data for {task.url_new}")
+
+        except ValidationError as e:
+            record_failure(session, task, page, f"Invalid data from {task.url_new}: {e}")
+            return None  # Skip the employer if the data is invalid
+
+        # The company's new data is written by the main process with the other companies of its batch
+        overview["employer_id"] = task.employer_id
+
+    # Validate all reviews at once, invalid reviews are still reported one by one
+    with timer("validate", employer=task.employer_id):
+        valid_reviews, invalid_reviews = validate_reviews(list(reviews_data.values()))
+    for review, e in invalid_reviews:
+        logger.error(
+            f"Invalid data for review: {e}", extra={"url": task.url_new, "review": review}
+        )
+
+    # Refreshed pages repeat the reviews stored by earlier runs
+    known = known_reviews()
+    if known is not None:
+        inc("scrape_known_reviews_total", sum(review["review_id"] in known for review in valid_reviews))
+        if SKIP_KNOWN_REVIEWS:
+            valid_reviews = known.filter(valid_reviews)
+
+    # Associate the reviews with the company
+    for review in valid_reviews:
+        review["employer_id"] = task.employer_id
+
+    # Commit the page's reviews together with its progress
+    try:
+        with timer("db_write", employer=task.employer_id):
+            try:
+                insert_reviews(session, valid_reviews)
+                finish_page_reviews(session, task, page, overview)
+            except (IntegrityError, DataError) as e:
+                session.rollback()
+                logger.error(
+                    f"Error for database commit: {e.orig}, writing the reviews one by one",
+                    extra={"url": task.url_new, "page": page},
+                )
+                valid_reviews = insert_reviews_one_by_one(session, task, page, valid_reviews)
+                finish_page_reviews(session, task, page, overview)
+
+        ########## Debug print statement ##########
+        print(f"Committed {len(valid_reviews)} reviews for {task.url_new} page {page}")
+
+    except (IntegrityError, Exception) as e:
+        record_failure(session, task, page, f"Error updating review data: {e}")
+        return None
+
+    return len(valid_reviews), overview
+
+
+def scrape_and_store(task: PageTask) -> Dict[str, Any]:
+    """
+    Scrapes a range of review pages of one employer and stores the reviews page by page.
+
+    Pages are streamed from `iter_pages()` and each page's reviews are committed together with its progress
+    row before the next page is fetched, so memory is bounded by one page and an interrupted run loses at most
+    the page in progress.
+
+    Args:
+        task (PageTask): The employer and pages to scrape. The first task of an employer covers page 1 only,
+            which reveals the employer's number of pages.
+
+    Returns:
+        Dict[str, Any]: The task, the number of reviews stored and, for the first task of an employer, the
+        validated overview data (None if scraping or validation failed). The overview is written by the
+        main process once all pages of the employer are done. "stopped" is set if the task was cut short
+        by a shutdown.
+    """
+    result = {"task": task, "overview": None, "reviews": 0}
+    set_labels(employer=task.employer_id)
+    set_employer(task.employer_id)
+
+    # Pages are fetched one at a time as the loop asks for them, so only one page is held in memory
+    pages = iter_pages(task.url_new, task.first_page, task.last_page)
+
+    try:
+        with get_db() as session:
+            for page in range(task.first_page, task.last_page + 1):
+                if stop_requested():
+                    result["stopped"] = True
+                    break  # Leave the other pages pending for --resume
+
+                with span("page", employer_id=task.employer_id, page=page) as page_span:
+                    start_page(session, task.employer_id, page)
+                    session.commit()
+
+                    try:
+                        overview_data, reviews_data = next(pages, ({}, {}))
+
+                        ########## Debug print statement ##########
+                        # print(f"Scraped data for {task}")
+
+                    except Exception as e:
+                        # Any error fails this page only, the task goes on with the next one
+                        record_failure(session, task, page, f"Error scraping data: {e}")
+                        page_span.set_error(f"Error scraping data: {e}")
+                        inc("scrape_page_errors_total")
+                        # The error ended the generator, continue with the next page
+                        pages = iter_pages(task.url_new, page + 1, task.last_page)
+                        continue
+
+                    with span("write"):
+                        try:
+                            stored = store_page(session, task, page, overview_data, reviews_data)
+                        except Exception as e:
+                            record_failure(session, task, page, f"Error storing data: {e}")
+                            stored = None
+                    if stored is None:
+                        page_span.set_error("Page not stored")
+                        inc("scrape_page_errors_total")
+                    else:
+                        page_span.attributes["reviews"] = stored[0]
+                        inc("scrape_pages_total")
+                        inc("scrape_reviews_total", stored[0])
+                        result["reviews"] += stored[0]
+                        result["overview"] = stored[1] or result["overview"]
+    finally:
+        # The pool may be terminated before the next periodic flush or dump
+        flush(force=True)
+        flush_spans(force=True)
+        snapshot_memory(task.employer_id)
+        checkpoint(force=True)
+
+    return result
+
+
+def parse_page_task(html: str, url: str) -> Tuple[dict, dict]:
+    """
+    Parses a page in a parser process of the asyncio engine, see `glassdoor.parse_page()`.
+    """
+    try:
+        return parse_page(html, url)
+    finally:
+        checkpoint()
+
+
+def split_task(task: PageTask, pages: int) -> Tuple[PageTask, PageTask]:
+    """
+    Splits a task after its first `pages` pages, e.g. to fit the rest of a run's page budget.
+
+    Returns:
+        Tuple[PageTask, PageTask]: The first pages and the other pages.
+    """
+    return task._replace(last_page=task.first_page + pages - 1), task._replace(first_page=task.first_page + pages)
+
+
+def split_pages(employer_id: int, url_new: str, pages: List[int]) -> List[PageTask]:
+    """
+    Splits pages of an employer into tasks of at most PAGE_CHUNK consecutive pages.
+
+    Args:
+        employer_id (int): The ID of the employer.
+        url_new (str): The reviews URL of the employer.
+        pages (List[int]): The sorted page numbers to scrape.
+
+    Returns:
+        List[PageTask]: The tasks, empty if there are no pages.
+    """
+    tasks = []
+    for page in pages:
+        if tasks and page == tasks[-1].last_page + 1 and page - tasks[-1].first_page < PAGE_CHUNK:
+            tasks[-1] = tasks[-1]._replace(last_page=page)
+        else:
+            tasks.append(PageTask(employer_id, url_new, page, page))
+    return tasks
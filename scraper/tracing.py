@@ -0,0 +1,272 @@
+from multiprocessing import current_process, util
+from urllib.request import Request, urlopen
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from time import monotonic, time_ns
+import hashlib
+import json
+import os
+
+from log import logger
+
+# Spans written per batch, or every FLUSH_SECONDS
+BATCH_SIZE = 512
+FLUSH_SECONDS = 5.0
+
+# Where spans are exported, an OTLP/JSON lines file and an OTLP/HTTP collector such as
+# http://localhost:4318/v1/traces. Tracing is off unless one of them is set.
+_path: Optional[str] = os.getenv("TRACE_PATH")
+_endpoint: Optional[str] = os.getenv("TRACE_ENDPOINT")
+
+# The trace of the run, shared with the worker processes so that their spans join it
+_trace_id: Optional[str] = os.getenv("TRACE_ID")
+
+# The current span of this thread or asyncio task
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+_buffer: List[Dict[str, Any]] = []
+_lock = Lock()
+_last_flush = monotonic()
+
+
+def configure(path: Optional[str] = None, endpoint: Optional[str] = None) -> None:
+    """
+    Turns tracing on in this process and in the worker processes it starts afterwards.
+
+    Args:
+        path (Optional[str]): The file spans are appended to, one OTLP/JSON export request per line.
+        endpoint (Optional[str]): The URL of an OTLP/HTTP collector that accepts JSON.
+    """
+    global _path, _endpoint
+    _path, _endpoint = path or _path, endpoint or _endpoint
+    for key, value in (("TRACE_PATH", _path), ("TRACE_ENDPOINT", _endpoint)):
+        if value:
+            os.environ[key] = value  # Read again by worker processes that are not forked
+
+
+def settings() -> Dict[str, Any]:
+    """
+    The exporters and the trace of the run, passed to worker processes that are not forked from this one.
+    """
+    return {"path": _path, "endpoint": _endpoint, "trace_id": _trace_id}
+
+
+def apply_settings(settings: Dict[str, Any]) -> None:
+    """
+    Joins the run's trace in a worker process, see `settings()`.
+    """
+    global _path, _endpoint, _trace_id
+    _path, _endpoint, _trace_id = settings["path"], settings["endpoint"], settings["trace_id"]
+
+
+def enabled() -> bool:
+    return bool(_path or _endpoint)
+
+
+class Span:
+    """
+    A timed operation of a trace, exported in the OTLP/JSON format when it ends.
+
+    Attributes:
+        name (str): The operation, e.g. "page" or "fetch".
+        trace_id (str): The 32 hex digit ID of the trace.
+        span_id (str): The 16 hex digit ID of the span.
+        parent_id (Optional[str]): The ID of the parent span, None for the root of a trace.
+    """
+
+    def __init__(
+        self, name: str, trace_id: str, parent_id: Optional[str] = None, span_id: Optional[str] = None, **attributes: Any
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id or os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.error: Optional[str] = None
+        self.start = time_ns()
+        self.end_time: Optional[int] = None
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        self.events.append((time_ns(), name, attributes))
+
+    def set_error(self, message: str) -> None:
+        self.error = message
+
+    def end(self, error: Optional[str] = None) -> None:
+        """
+        Ends the span and queues it for export, once.
+        """
+        if self.end_time is not None:
+            return
+        self.end_time = time_ns()
+        self.error = error or self.error
+        if enabled():
+            with _lock:
+                _buffer.append(self.to_otlp())
+            flush()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": _attributes(self.attributes),
+            "events": [
+                {"timeUnixNano": str(t), "name": name, "attributes": _attributes(attributes)}
+                for t, name, attributes in self.events
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            values.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            values.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            values.append({"key": key, "value": {"doubleValue": value}})
+        elif value is not None:
+            values.append({"key": key, "value": {"stringValue": str(value)}})
+    return values
+
+
+def start_run(**attributes: Any) -> Span:
+    """
+    Starts the root span of a run, whose trace the worker processes started afterwards join.
+    """
+    global _trace_id
+    run = Span("run", os.urandom(16).hex(), **attributes)
+    _trace_id = os.environ["TRACE_ID"] = run.trace_id
+    _current.set(run)
+    return run
+
+
+def employer_span_id(employer_id: int) -> str:
+    """
+    The span ID of an employer in the current run, derived from the trace ID so that worker processes can
+    attach their page spans to the employer span of the main process without being told its ID.
+    """
+    return hashlib.blake2b(f"{_trace_id}:{employer_id}".encode(), digest_size=8).hexdigest()
+
+
+def start_employer(employer_id: int, **attributes: Any) -> Optional[Span]:
+    """
+    Starts the span of an employer in the run, ended by the caller once all of its pages are done.
+    """
+    if _trace_id is None:
+        return None
+    parent = _current.get()
+    return Span(
+        "employer",
+        _trace_id,
+        parent.span_id if parent else None,
+        employer_span_id(employer_id),
+        employer_id=employer_id,
+        **attributes,
+    )
+
+
+def set_employer(employer_id: int) -> None:
+    """
+    Makes the spans started from now on in this thread or asyncio task children of the employer's span.
+    Outside a run, each of them starts its own trace.
+    """
+    # A stand-in for the employer span of the main process, which is never exported from here
+    _current.set(Span("employer", _trace_id, span_id=employer_span_id(employer_id)) if _trace_id is not None else None)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Runs the block in a span, a child of the current span. An error raised by the block is recorded as the
+    span's status.
+    """
+    parent = _current.get()
+    current = Span(name, parent.trace_id if parent else os.urandom(16).hex(), parent.span_id if parent else None, **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def add_event(name: str, **attributes: Any) -> None:
+    """
+    Records an event, e.g. a retry, on the current span of this thread or asyncio task.
+    """
+    current = _current.get()
+    if current is not None:
+        current.add_event(name, **attributes)
+
+
+def flush(force: bool = False) -> None:
+    """
+    Exports the ended spans, at most once per FLUSH_SECONDS unless forced or BATCH_SIZE spans are waiting.
+    """
+    global _last_flush
+    with _lock:
+        if not _buffer or (not force and len(_buffer) < BATCH_SIZE and monotonic() - _last_flush < FLUSH_SECONDS):
+            return
+        spans = _buffer[:]
+        _buffer.clear()
+        _last_flush = monotonic()
+
+    request = {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _attributes(
+                        {"service.name": "glassdoor-scraper", "process.pid": os.getpid(), "worker": current_process().name}
+                    )
+                },
+                "scopeSpans": [{"scope": {"name": "scraper"}, "spans": spans}],
+            }
+        ]
+    }
+    data = json.dumps(request).encode()
+
+    if _path:
+        try:
+            # One write per batch on an O_APPEND file, so batches of concurrent processes do not interleave
+            fd = os.open(_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, data + b"\n")
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.error(f"Error writing traces: {e}", extra={"path": _path})
+    if _endpoint:
+        try:
+            urlopen(Request(_endpoint, data, {"Content-Type": "application/json"}), timeout=10).close()
+        except OSError as e:
+            logger.error(f"Error exporting traces: {e}", extra={"endpoint": _endpoint})
+
+
+def _after_fork() -> None:
+    """
+    Drops the spans inherited from the parent process, which exports them itself, and exports the rest of
+    this process's spans when it exits.
+    """
+    global _lock
+    _lock = Lock()
+    _buffer.clear()
+    util.Finalize(None, flush, kwargs={"force": True}, exitpriority=10)
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,181 @@
+from multiprocessing import Event as ProcessEvent, Process, cpu_count
+from threading import Event, Thread
+from typing import Any, Dict, Optional
+from time import monotonic
+import argparse
+import signal
+import socket
+import os
+
+from database import PageProgress, get_db, close_known_reviews, share_known_reviews
+from jobs import LEASE_SECONDS, Broker, DatabaseBroker, Job
+from tasks import SHUTDOWN_SECONDS, PageTask, init_worker, scrape_and_store, split_pages, stop_requested
+from log import logger, setup_logging
+from metrics import Collector, set_worker
+from bootstrap import configure_workers, worker_state
+from profiling import configure as configure_profiling, report as profile_report
+
+
+def run_job(task: PageTask) -> Dict[str, Any]:
+    """
+    Scrapes the pages of a job that are not done yet.
+
+    A job is leased again when its worker lost the lease, so pages that the previous worker already stored
+    are skipped instead of storing their reviews twice.
+
+    Args:
+        task (PageTask): The employer and pages to scrape.
+
+    Returns:
+        Dict[str, Any]: The result of `scrape_and_store()` over the whole job.
+    """
+    with get_db() as session:
+        done = dict(
+            session.query(PageProgress.page, PageProgress.overview).filter(
+                PageProgress.employer_id == task.employer_id,
+                PageProgress.page.between(task.first_page, task.last_page),
+                PageProgress.status == "done",
+            )
+        )
+
+    result = {"task": task, "overview": done.get(1), "reviews": 0}
+    pages = [page for page in range(task.first_page, task.last_page + 1) if page not in done]
+    for page_task in split_pages(task.employer_id, task.url_new, pages):
+        page_result = scrape_and_store(page_task)
+        result["reviews"] += page_result["reviews"]
+        result["overview"] = page_result["overview"] or result["overview"]
+        if page_result.get("stopped") or stop_requested():
+            result["stopped"] = True
+            break
+    return result
+
+
+def keep_leased(broker: Broker, job: Job, worker: str, lease_seconds: float, done: Event) -> None:
+    """
+    Sends heartbeats for a job until it is done, three per lease so that one late heartbeat does no harm.
+    """
+    while not done.wait(lease_seconds / 3):
+        if not broker.heartbeat(job.id, worker, lease_seconds):
+            logger.warning("Lost the lease of a job", extra={"job": job.id, "worker": worker})
+            return
+
+
+def run_worker(
+    broker: Broker,
+    worker: str,
+    lease_seconds: float = LEASE_SECONDS,
+    poll_seconds: float = 5.0,
+    idle_seconds: Optional[float] = None,
+    stop: Optional[Event] = None,
+) -> None:
+    """
+    Leases jobs from the broker and scrapes them one at a time.
+
+    Args:
+        broker (Broker): The broker shared with the coordinator.
+        worker (str): The name of the worker, unique across nodes.
+        lease_seconds (float): How long a job stays leased without a heartbeat.
+        poll_seconds (float): How long to wait before asking again when no job is queued.
+        idle_seconds (Optional[float]): Stop after this long without a job. Defaults to None, which keeps
+            waiting for jobs.
+        stop (Optional[Event]): Stop before leasing the next job once set.
+    """
+    stop = stop or Event()
+    idle_since = monotonic()
+
+    while not stop.is_set():
+        job = broker.lease(worker, lease_seconds)
+        if job is None:
+            if idle_seconds is not None and monotonic() - idle_since >= idle_seconds:
+                break
+            stop.wait(poll_seconds)
+            continue
+
+        done = Event()
+        heartbeat = Thread(target=keep_leased, args=(broker, job, worker, lease_seconds, done), daemon=True)
+        heartbeat.start()
+        try:
+            result = run_job(job.task)
+        except Exception as e:
+            logger.error(f"Error in worker: {e}", extra={"url": job.task.url_new, "worker": worker})
+            broker.fail(job.id, worker, str(e))
+        else:
+            if result.get("stopped"):
+                # Hand the rest of the job to another worker, which skips the pages stored here
+                broker.fail(job.id, worker, "Worker shut down")
+            else:
+                broker.complete(job.id, worker, {"overview": result["overview"], "reviews": result["reviews"]})
+        finally:
+            done.set()
+            heartbeat.join()
+        idle_since = monotonic()
+
+
+def start_worker(worker: str, idle_seconds: Optional[float], stop: Any, state: Dict[str, Any]) -> None:
+    """
+    Runs a worker against the database broker in this process, until `stop` is set by the parent process.
+    """
+    init_worker(stop, state)
+    set_worker(worker)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # The parent process decides when to stop
+    run_worker(DatabaseBroker(), worker, idle_seconds=idle_seconds, stop=stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the jobs queued by a coordinator, `main.py --engine distributed`.")
+    parser.add_argument("--processes", type=int, default=cpu_count(), help="worker processes on this node")
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}", help="name of this node's workers")
+    parser.add_argument("--idle-minutes", type=float, help="stop after this many minutes without a job")
+    parser.add_argument("--metrics-port", type=int, help="serve this node's Prometheus metrics on this local port")
+    parser.add_argument("--profile", nargs="?", const=os.path.join(os.getenv("LOG_PATH", "."), "profiles"), help="profile every worker process and merge their profiles, in profiles in LOG_PATH by default")
+    parser.add_argument("--profile-seconds", type=float, help="profile each worker for this many seconds from its start, defaults to the whole run")
+    parser.add_argument("--profile-memory", action="store_true", help="with --profile, also trace the memory each employer leaves allocated")
+    args = parser.parse_args()
+
+    # Start the workers from a forkserver, before any queue or event is created
+    configure_workers()
+
+    # Setup logging
+    listener = setup_logging()
+    collector = Collector(port=args.metrics_port).start()
+    profile_path = configure_profiling(args.profile, args.profile_seconds, args.profile_memory) if args.profile else None
+
+    # On SIGINT or SIGTERM, the workers finish the page in progress and hand the rest of their job back
+    stop = ProcessEvent()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+    # Reviews stored before, shared with the workers, which skip them on refreshed pages
+    with get_db() as session:
+        share_known_reviews(session)
+
+    try:
+        idle_seconds = args.idle_minutes * 60 if args.idle_minutes is not None else None
+        state = worker_state()
+        workers = [
+            Process(target=start_worker, args=(f"{args.name}-{i}", idle_seconds, stop, state))
+            for i in range(args.processes)
+        ]
+        for process in workers:
+            process.start()
+
+        deadline = None
+        while alive := [process for process in workers if process.is_alive()]:
+            if stop.is_set() and deadline is None:
+                deadline = monotonic() + SHUTDOWN_SECONDS
+            if deadline is not None and monotonic() >= deadline:
+                # The leases of the killed workers expire and their jobs are leased again
+                for process in alive:
+                    process.kill()
+                break
+            alive[0].join(timeout=1)
+    finally:
+        # Freed even if the workers could not be started
+        close_known_reviews()
+
+    if profile_path is not None:
+        print(f"Profile report: {profile_report(profile_path)}")
+
+    # Write the last metrics snapshot and stop the listener, after it wrote the records still queued
+    collector.stop()
+    listener.stop()
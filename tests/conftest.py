@@ -0,0 +1,12 @@
+import tempfile
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The scraper's modules import each other by name, and `log` from the project root
+sys.path[:0] = [os.path.join(ROOT, "scraper"), ROOT]
+
+# Tests never touch the database of `.env`, each one creates the engine it needs
+os.environ["URL_DB"] = "sqlite://"
+os.environ.setdefault("LOG_PATH", tempfile.mkdtemp(prefix="scraper-tests-"))
@@ -0,0 +1,57 @@
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+
+import pytest
+
+from companies import flush_resolved
+from database import Base, Company, SearchCache, TypeaheadCache, upsert_companies
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/companies.db")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    upsert_companies(session, [{"employer_id": i, "employer_name": f"Company {i}"} for i in (1, 2, 3, 4)])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def resolved(old_employer_id: int, employer_id: int) -> dict:
+    return {"old_employer_id": old_employer_id, "employer_id": employer_id, "employer_name": f"Employer {employer_id}", "query": f"Company {old_employer_id}"}
+
+
+def test_flush_resolved_writes_batch(db):
+    cache = TypeaheadCache()
+    cache.put("Company 1", [{"employer_id": 101}])
+    batch, not_found = [resolved(1, 101), resolved(2, 3)], [{"employer_id": 4, "id_not_found": True}]
+
+    # Company 2 resolves to the employer of company 3, which keeps it
+    assert flush_resolved(db, batch, not_found, cache) == [101]
+    assert batch == [] and not_found == []
+
+    companies = {company.employer_id: company for company in db.scalars(select(Company))}
+    assert sorted(companies) == [2, 3, 4, 101]
+    assert companies[101].url_new.endswith("-E101.htm")
+    assert companies[4].id_not_found
+    assert db.scalars(select(SearchCache.query)).all() == ["company 1"]
+
+
+def test_flush_resolved_retries_one_by_one(db):
+    # Another process took employer ID 666 between the check and the update
+    db.execute(text(
+        "CREATE TRIGGER taken BEFORE UPDATE ON company WHEN NEW.employer_id = 666 BEGIN SELECT RAISE(ABORT, 'taken'); END"
+    ))
+    db.commit()
+    cache = TypeaheadCache()
+    cache.put("Company 1", [{"employer_id": 101}])
+    batch, not_found = [resolved(1, 101), resolved(2, 666), resolved(3, 103)], [{"employer_id": 4, "id_not_found": True}]
+
+    assert flush_resolved(db, batch, not_found, cache) == [101, 103]
+
+    companies = {company.employer_id: company for company in db.scalars(select(Company))}
+    assert sorted(companies) == [2, 4, 101, 103]
+    assert companies[4].id_not_found
+    assert db.scalars(select(SearchCache.query)).all() == ["company 1"]
@@ -0,0 +1,33 @@
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import pandas as pd
+import pytest
+
+import create_company
+from create_company import check_columns, load_companies
+from database import Base, Company
+
+
+def test_check_columns():
+    check_columns(["employer_name", "gvkey"])
+    check_columns(["employer", "gvkey", "tier"])
+
+    with pytest.raises(ValueError, match="employer"):
+        check_columns(["employer_name", "gvkey", "tier"])
+    with pytest.raises(ValueError, match="employer_name"):
+        check_columns(["name"])
+
+
+def test_missing_column_fails_before_loading(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/companies.db")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(create_company, "get_db", sessionmaker(bind=engine))
+    path = tmp_path / "companies.csv"
+    pd.DataFrame({"employer_name": ["Acme"], "gvkey": [1], "tier": [1]}).to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match=r"\['employer'\]"):
+        load_companies(str(path))
+    with sessionmaker(bind=engine)() as session:
+        assert session.scalars(select(Company)).all() == []
+    engine.dispose()
@@ -0,0 +1,116 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from contextlib import contextmanager
+
+import pytest
+
+import jobs
+from database import Base
+from jobs import Broker, DatabaseBroker, MemoryBroker
+from tasks import PageTask
+
+TASKS = [PageTask(1, "https://x/Reviews/a-Reviews-E1.htm", 1, 1), PageTask(2, "https://x/Reviews/b-Reviews-E2.htm", 2, 20)]
+
+
+@pytest.fixture(params=["memory", "database"])
+def broker(request, tmp_path, monkeypatch):
+    if request.param == "memory":
+        yield MemoryBroker(max_attempts=2)
+        return
+
+    # The database broker opens its sessions with `get_db()`, pointed at a SQLite file of the test
+    engine = create_engine(f"sqlite:///{tmp_path}/jobs.db")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db():
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    monkeypatch.setattr(jobs, "get_db", get_db)
+    yield DatabaseBroker(max_attempts=2)
+    engine.dispose()
+
+
+def test_broker_is_abstract():
+    with pytest.raises(TypeError):
+        Broker()
+
+
+def test_lease_oldest_job_once(broker):
+    ids = [broker.put(task) for task in TASKS]
+
+    first = broker.lease("a")
+    second = broker.lease("b")
+    assert (first.id, first.task) == (ids[0], TASKS[0])
+    assert (second.id, second.task) == (ids[1], TASKS[1])
+    assert broker.lease("c") is None
+
+
+def test_heartbeat_only_by_lease_holder(broker):
+    job_id = broker.put(TASKS[0])
+    broker.lease("a")
+
+    assert broker.heartbeat(job_id, "a")
+    assert not broker.heartbeat(job_id, "b")
+
+
+def test_expired_lease_is_leased_again(broker):
+    job_id = broker.put(TASKS[0])
+    assert broker.lease("a", lease_seconds=-1).id == job_id
+
+    # The second worker takes over, the first one lost its lease
+    job = broker.lease("b")
+    assert job.id == job_id
+    assert not broker.heartbeat(job_id, "a")
+    assert not broker.complete(job_id, "a", {"reviews": 1})
+    assert broker.complete(job_id, "b", {"reviews": 2})
+
+
+def test_expired_too_often_is_given_up(broker):
+    job_id = broker.put(TASKS[0])
+    broker.lease("a", lease_seconds=-1)
+    broker.lease("b", lease_seconds=-1)
+
+    assert broker.lease("c") is None
+    [finished] = broker.collect()
+    assert (finished.job.id, finished.status, finished.result) == (job_id, "failed", {"error": "Lease expired"})
+
+
+def test_complete_is_collected_once(broker):
+    job_id = broker.put(TASKS[1])
+    broker.lease("a")
+    assert broker.complete(job_id, "a", {"reviews": 10})
+
+    [finished] = broker.collect()
+    assert finished.job.task == TASKS[1]
+    assert (finished.status, finished.result) == ("done", {"reviews": 10})
+    assert broker.collect() == []
+    assert broker.lease("a") is None
+
+
+def test_fail_requeues_then_gives_up(broker):
+    job_id = broker.put(TASKS[0])
+    broker.lease("a")
+    assert broker.fail(job_id, "a", "Proxy error")
+
+    assert broker.lease("b").id == job_id
+    assert broker.fail(job_id, "b", "Proxy error")
+    assert broker.lease("c") is None
+    [finished] = broker.collect()
+    assert (finished.status, finished.result) == ("failed", {"error": "Proxy error"})
+
+
+def test_clear(broker):
+    done, queued = broker.put(TASKS[0]), broker.put(TASKS[1])
+    broker.lease("a")
+    broker.complete(done, "a", {})
+
+    assert broker.clear("done") == [done]
+    assert broker.clear() == [queued]
+    assert broker.lease("a") is None
@@ -0,0 +1,40 @@
+import logging
+import time
+
+from log.logger import RateLimitFilter
+
+
+def record(message: str, level: int = logging.ERROR, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_rate_limited_per_url_whatever_the_key_case():
+    rate_limit = RateLimitFilter(limit=2, seconds=60)
+    url = "https://x/Reviews/a-Reviews-E1.htm"
+
+    # Error storms log a different message for each failure of the same URL
+    passed = [rate_limit.filter(record(f"Network error {i}", URL=url)) for i in range(3)]
+    passed.append(rate_limit.filter(record("HTTP error 500", url=url)))
+    assert passed == [True, True, False, False]
+
+    assert rate_limit.filter(record("Network error", URL="https://x/Reviews/b-Reviews-E2.htm"))
+
+
+def test_rate_limited_per_message_and_level_without_url():
+    rate_limit = RateLimitFilter(limit=1, seconds=60)
+
+    assert rate_limit.filter(record("Error in worker"))
+    assert not rate_limit.filter(record("Error in worker"))
+    assert rate_limit.filter(record("Error in worker", logging.WARNING))
+
+
+def test_suppressed_count_after_window():
+    rate_limit = RateLimitFilter(limit=1, seconds=0.05)
+
+    assert [rate_limit.filter(record("Error", url="u")) for _ in range(4)] == [True, False, False, False]
+    time.sleep(0.06)
+    next_record = record("Error", url="u")
+    assert rate_limit.filter(next_record)
+    assert next_record.suppressed == 3
@@ -0,0 +1,70 @@
+import pytest
+
+from resolver import LocalResolver, name_key
+
+
+@pytest.mark.parametrize(
+    "name, key",
+    [
+        ("NVIDIA Corp", "nvidia"),
+        ("Nvidia Corporation", "nvidia"),
+        ("Microsoft Corp.", "microsoft"),
+        ("Procter & Gamble Co", "procter & gamble"),
+        ("Société Générale SA", "societe generale"),
+        ("Alphabet Holding Co", "alphabet holding"),
+        ("General Electric International Inc", "general electric international"),
+        ("Co", "co"),
+    ],
+)
+def test_name_key(name, key):
+    assert name_key(name) == key
+
+
+@pytest.fixture
+def resolver():
+    resolver = LocalResolver(threshold=0.88)
+    for employer_id, name in [
+        (1, "NVIDIA Corp"),
+        (2, "Alphabet Inc"),
+        (3, "General Electric Co"),
+        (4, "Johnson & Johnson"),
+        (5, "Acme Holdings"),
+        (6, "Acme Holdings Ltd"),
+    ]:
+        resolver.add(employer_id, name, name)
+    return resolver
+
+
+@pytest.mark.parametrize(
+    "name, employer_id",
+    [
+        ("Nvidia Corporation", 1),
+        ("nvidia", 1),
+        ("ALPHABET INC.", 2),
+        ("General Electric Company", 3),
+        ("Johnson & Johnson Inc", 4),
+    ],
+)
+def test_match_variants(resolver, name, employer_id):
+    assert resolver.match(name)["employer_id"] == employer_id
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "Alphabet Holding Co",
+        "General Electric International Inc",
+        "Johnson Controls",
+        "Nvidia Holdings",
+        "Acme Holdings plc",  # Two employers share the name
+        "",
+    ],
+)
+def test_match_false_friends(resolver, name):
+    assert resolver.match(name) is None
+
+
+def test_hits_are_counted(resolver):
+    resolver.match("Nvidia Corporation")
+    resolver.match("Alphabet Holding Co")
+    assert resolver.hits == 1
@@ -0,0 +1,37 @@
+from scheduler import ScheduleConfig, Scheduler
+from tasks import PageTask, split_task
+
+URL = "https://x/Reviews/a-Reviews-E1.htm"
+
+
+def test_last_task_is_split_to_fit_page_budget():
+    scheduler = Scheduler(ScheduleConfig(max_pages=25), split=split_task)
+    scheduler.push(PageTask(1, URL, 2, 21), 20)
+    scheduler.push(PageTask(1, URL, 22, 41), 20)
+
+    assert scheduler.pop() == PageTask(1, URL, 2, 21)
+    assert scheduler.pop() == PageTask(1, URL, 22, 26)
+    assert scheduler.exhausted and scheduler.pages == 25
+    assert scheduler.pop() is None
+
+    # The pages beyond the budget stay queued for --resume
+    assert len(scheduler) == 1
+
+
+def test_without_split_task_over_budget_stays_queued():
+    scheduler = Scheduler(ScheduleConfig(max_pages=5))
+    scheduler.push(PageTask(1, URL, 1, 1), 1, priority=1.0)
+    scheduler.push(PageTask(1, URL, 2, 21), 20)
+
+    assert scheduler.pop() == PageTask(1, URL, 1, 1)
+    assert scheduler.pop() is None
+    assert scheduler.exhausted and scheduler.pages == 1
+    assert len(scheduler) == 1
+
+
+def test_time_budget_expires():
+    scheduler = Scheduler(ScheduleConfig(max_seconds=0))
+    scheduler.push(PageTask(1, URL, 1, 1), 1)
+
+    assert scheduler.expired and scheduler.exhausted
+    assert scheduler.pop() is None
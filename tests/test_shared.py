@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from multiprocessing import resource_tracker
+
+import pytest
+
+from database import Base, Review
+from database.shared import KnownReviews
+
+
+@pytest.fixture
+def known(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/reviews.db")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Review(review_id=i, employer_id=1) for i in (9, 1, 5)])
+    session.commit()
+    known = KnownReviews.load(session)
+    yield known
+    known.close()
+    session.close()
+    engine.dispose()
+
+
+def test_lookups(known):
+    assert len(known) == 3
+    assert [i in known for i in (1, 2, 5, 9, 10)] == [True, False, True, True, False]
+    assert known.filter([{"review_id": 2}, {"review_id": 5}]) == [{"review_id": 2}]
+
+
+def test_attach_is_not_tracked(known, monkeypatch):
+    registered = []
+    monkeypatch.setattr(resource_tracker, "register", lambda name, rtype: registered.append(name))
+
+    attached = KnownReviews.attach(known.name, len(known))
+    try:
+        assert 5 in attached and 2 not in attached
+    finally:
+        attached.close()
+
+    # Only the owner tracks the block, so a worker's exit leaves it to the owner to free
+    assert registered == []
@@ -0,0 +1,49 @@
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import pytest
+
+import tasks
+from database import Base, PageProgress, Review
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/tasks.db")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(tasks, "get_db", sessionmaker(bind=engine))
+    yield engine
+    engine.dispose()
+
+
+def test_page_error_fails_that_page_only(db, monkeypatch):
+    def iter_pages(url, first_page, last_page):
+        for page in range(first_page, last_page + 1):
+            if page == 2:
+                raise ConnectionError("connection reset")
+            yield {"employer_id": 1}, {}
+
+    monkeypatch.setattr(tasks, "iter_pages", iter_pages)
+    result = tasks.scrape_and_store(tasks.PageTask(1, "https://www.glassdoor.com/Reviews/x-E1.htm", 2, 4))
+
+    assert result["reviews"] == 0 and "stopped" not in result
+    with sessionmaker(bind=db)() as session:
+        status = dict(session.execute(select(PageProgress.page, PageProgress.status)).all())
+        error = session.scalar(select(PageProgress.last_error).where(PageProgress.page == 2))
+    assert status == {2: "failed", 3: "done", 4: "done"}
+    assert "connection reset" in error
+
+
+def test_bad_review_is_dropped_from_its_page(db, monkeypatch):
+    # The second review reuses the primary key of the first
+    rows = [{"id": 1, "review_id": 11}, {"id": 1, "review_id": 12}, {"id": 2, "review_id": 13}]
+    monkeypatch.setattr(tasks, "validate_reviews", lambda reviews: (rows, []))
+
+    task = tasks.PageTask(1, "https://www.glassdoor.com/Reviews/x-E1.htm", 2, 2)
+    with sessionmaker(bind=db)() as session:
+        tasks.start_page(session, 1, 2)
+        session.commit()
+        assert tasks.store_page(session, task, 2, {"employer_id": 1}, {}) == (2, None)
+
+        assert session.scalars(select(Review.review_id).order_by(Review.review_id)).all() == [11, 13]
+        assert session.scalar(select(PageProgress.status).where(PageProgress.page == 2)) == "done"